@@ -25,16 +25,23 @@ if const.MOCKED_SERVER:
     logging.debug("Importing mocked resources")
     from .tests.mock_tournaments import Tournaments
     from .tests.mock_scores import Scores
+    from .tests.mock_jobs import CommitJobs
 else:
     logging.debug("Importing real resources")
     from .resources.tournaments import Tournaments
     from .resources.scores import Scores
+    from .resources.jobs import CommitJobs
+    from .mapping.mapper import Mapper
+
+    #Parsing the static tournament and map information once at startup
+    Mapper.preload()
 from .resources.player import Player
 
 cors = CORS(
     allow_all_origins=True,
     allow_methods_list=['GET', 'PUT', 'POST'],
-    allow_headers_list=['content-type'])
+    allow_headers_list=['content-type'],
+    expose_headers_list=['x-snapshot-age', 'x-snapshot-error', 'location'])
 
 # this is my eth account address
 address = const.PLAYER_OWN_ADD
@@ -45,3 +52,4 @@ api.add_route('/api/tournaments/{tournament_id}', Tournaments(address), suffix='
 api.add_route('/api/tournaments/{tournament_id}/scores/my', Scores(address), suffix='my')
 api.add_route('/api/tournaments/{tournament_id}/scores/{player_id}', Scores(address))
 api.add_route('/api/me', Player(address))
+api.add_route('/api/jobs/{job_id}', CommitJobs())
@@ -52,36 +52,125 @@ if MOCKED_SERVER:
 else:
     DB_NAME = os.getenv("DB_NAME", default="creepts/db/creepts.db")
 
+#Seconds a connection waits for another writer to release the database
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", default="10"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", default="NORMAL")
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", default="16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", default=str(64 * 1024 * 1024)))
+
 USER_LOG_TABLE = "user_logs"
 CREATE_USER_LOG_TABLE = "CREATE TABLE {} (user_id TEXT NOT NULL, tournament_id TEXT NOT NULL, score INTEGER NOT NULL, waves INTEGER NOT NULL, log BLOB NOT NULL);".format(USER_LOG_TABLE)
-INSERT_SINGLE_LOG_TABLE = "INSERT INTO {} ('user_id', 'tournament_id', 'score', 'waves', 'log') VALUES (?, ?, ?, ?, ?);".format(USER_LOG_TABLE)
-SELECT_LOG_TABLE_FROM_USER_AND_TOURNAMENT = "SELECT * FROM {} WHERE user_id=? and tournament_id=?".format(USER_LOG_TABLE)
-BASE_SELECT_LOG_TABLE_FROM_TOURNAMENTS = "SELECT * FROM {} WHERE tournament_id in ".format(USER_LOG_TABLE) #The list is not supported by sqlite argument formatting so it is substituted in the program itself
-UPDATE_LOG_TABLE_FOR_USER_AND_TOURNAMENT = "UPDATE {} SET score=?, waves=?, log=? WHERE user_id=? and tournament_id=?".format(USER_LOG_TABLE)
+DELETE_DUPLICATED_LOG_TABLE_ENTRIES = "DELETE FROM {0} WHERE EXISTS (SELECT 1 FROM {0} AS better WHERE better.tournament_id = {0}.tournament_id AND better.user_id = {0}.user_id AND (better.score > {0}.score OR (better.score = {0}.score AND better.rowid > {0}.rowid)))".format(USER_LOG_TABLE)
+CREATE_USER_LOG_TOURNAMENT_USER_INDEX = "CREATE UNIQUE INDEX {0}_tournament_user ON {0} (tournament_id, user_id);".format(USER_LOG_TABLE)
+#Covers the scores listing of tournaments, which never needs to read the table itself
+CREATE_USER_LOG_TOURNAMENT_SCORES_INDEX = "CREATE INDEX {0}_tournament_scores ON {0} (tournament_id, user_id, score, waves);".format(USER_LOG_TABLE)
+#Logs are kept in the log store, the table only references them by hash
+USER_LOG_TABLE_WITH_LOG_HASH = "user_logs_with_log_hash"
+CREATE_USER_LOG_TABLE_WITH_LOG_HASH = "CREATE TABLE {} (user_id TEXT NOT NULL, tournament_id TEXT NOT NULL, score INTEGER NOT NULL, waves INTEGER NOT NULL, log_hash TEXT NOT NULL);".format(USER_LOG_TABLE_WITH_LOG_HASH)
+INSERT_SINGLE_LOG_TABLE = "INSERT INTO {} ('user_id', 'tournament_id', 'score', 'waves', 'log_hash') VALUES (?, ?, ?, ?, ?);".format(USER_LOG_TABLE)
+SELECT_LOG_TABLE_FROM_USER_AND_TOURNAMENT = "SELECT user_id, tournament_id, score, waves, log_hash FROM {} WHERE user_id=? and tournament_id=?".format(USER_LOG_TABLE)
+BASE_SELECT_LOG_TABLE_FROM_TOURNAMENTS = "SELECT user_id, tournament_id, score, waves FROM {} WHERE tournament_id in ".format(USER_LOG_TABLE) #The list of placeholders depends on the number of tournaments so it is appended in the program itself
+UPDATE_LOG_TABLE_FOR_USER_AND_TOURNAMENT = "UPDATE {} SET score=?, waves=?, log_hash=? WHERE user_id=? and tournament_id=?".format(USER_LOG_TABLE)
+INSERT_NEW_LOG_TABLE_ENTRY = "INSERT OR IGNORE INTO {} ('user_id', 'tournament_id', 'score', 'waves', 'log_hash') VALUES (?, ?, ?, ?, ?);".format(USER_LOG_TABLE)
+UPDATE_LOG_TABLE_IF_HIGHER_SCORE = "UPDATE {} SET score=?, waves=?, log_hash=? WHERE user_id=? and tournament_id=? and score<?".format(USER_LOG_TABLE)
+
+#Directory of the content addressed game log store, defaults to a logs directory next to the database
+LOG_STORE_DIR = os.getenv("LOG_STORE_DIR", default="")
+
+#Queue of the log commits to the dispatcher, run in background by the commit workers
+COMMIT_JOB_TABLE = "commit_jobs"
+CREATE_COMMIT_JOB_TABLE = "CREATE TABLE {} (id INTEGER PRIMARY KEY AUTOINCREMENT, tournament_id TEXT NOT NULL, log_hash TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, lease_until REAL, hash TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL);".format(COMMIT_JOB_TABLE)
+CREATE_COMMIT_JOB_STATUS_INDEX = "CREATE INDEX {0}_status ON {0} (status, next_attempt_at);".format(COMMIT_JOB_TABLE)
+CREATE_COMMIT_JOB_TOURNAMENT_INDEX = "CREATE INDEX {0}_tournament ON {0} (tournament_id, status);".format(COMMIT_JOB_TABLE)
+INSERT_COMMIT_JOB = "INSERT INTO {} (tournament_id, log_hash, status, next_attempt_at, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?, ?);".format(COMMIT_JOB_TABLE)
+SUPERSEDE_PENDING_COMMIT_JOBS = "UPDATE {} SET status='superseded', updated_at=? WHERE tournament_id=? AND status='pending' AND id<?".format(COMMIT_JOB_TABLE)
+#Oldest job ready to run, or left running by a worker that died, unless another job of its tournament is running
+SELECT_NEXT_COMMIT_JOB = "SELECT id, tournament_id, log_hash, attempts, status FROM {0} AS job WHERE ((status='pending' AND next_attempt_at<=?) OR (status='running' AND lease_until<?)) AND NOT EXISTS (SELECT 1 FROM {0} AS other WHERE other.tournament_id=job.tournament_id AND other.status='running' AND other.lease_until>=? AND other.id!=job.id) ORDER BY id LIMIT 1".format(COMMIT_JOB_TABLE)
+CLAIM_COMMIT_JOB = "UPDATE {} SET status='running', attempts=attempts+1, lease_until=?, updated_at=? WHERE id=?".format(COMMIT_JOB_TABLE)
+SELECT_NEWER_COMMIT_JOB = "SELECT 1 FROM {} WHERE tournament_id=? AND id>? LIMIT 1".format(COMMIT_JOB_TABLE)
+FINISH_COMMIT_JOB = "UPDATE {} SET status=?, hash=?, error=?, next_attempt_at=?, lease_until=NULL, updated_at=? WHERE id=?".format(COMMIT_JOB_TABLE)
+SELECT_COMMIT_JOB = "SELECT id, tournament_id, status, attempts, hash, error, created_at, updated_at FROM {} WHERE id=?".format(COMMIT_JOB_TABLE)
+
+#Number of background threads committing logs in each process
+COMMIT_WORKERS = int(os.getenv("COMMIT_WORKERS", default="2"))
+#Attempts of a commit before giving up, retries wait a delay doubled at each attempt up to the maximum
+COMMIT_JOB_MAX_ATTEMPTS = int(os.getenv("COMMIT_JOB_MAX_ATTEMPTS", default="5"))
+COMMIT_JOB_RETRY_DELAY = float(os.getenv("COMMIT_JOB_RETRY_DELAY", default="2"))
+COMMIT_JOB_MAX_RETRY_DELAY = float(os.getenv("COMMIT_JOB_MAX_RETRY_DELAY", default="60"))
+#Seconds a running job is owned by its worker, after them it is taken as crashed and run again
+COMMIT_JOB_LEASE = float(os.getenv("COMMIT_JOB_LEASE", default="300"))
+#Seconds between checks of the queue when no new job is notified
+COMMIT_JOB_POLL_INTERVAL = float(os.getenv("COMMIT_JOB_POLL_INTERVAL", default="1"))
 
 #GAMEPLAY LOG FILES RELATED
 
 LOGGER_URL = os.getenv("LOGGER_URL", default="logger:50051")
 LOGGER_DATA_DIR = os.getenv("LOGGER_DATA_DIR", default="/opt/cartesi/srv/logger-server")
+#Seconds a download request waits for the logger, and keepalive pings of the connection to it
+LOGGER_REQUEST_TIMEOUT = float(os.getenv("LOGGER_REQUEST_TIMEOUT", default="10"))
+LOGGER_KEEPALIVE_TIME = float(os.getenv("LOGGER_KEEPALIVE_TIME", default="30"))
+LOGGER_KEEPALIVE_TIMEOUT = float(os.getenv("LOGGER_KEEPALIVE_TIMEOUT", default="10"))
 LOG_FILES_OUTPUT_DIR = os.getenv("LOG_FILES_OUTPUT_DIR", default="creepts/logs-to-share/")
 DEFAULT_PAGE_LOG2_BYTES_SIZE = 10
 DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE = 20
 
+#Serialized opponent and winner logs kept in memory, and spilled over to LOG_CACHE_DIR when evicted
+LOG_CACHE_SIZE = int(os.getenv("LOG_CACHE_SIZE", default="64"))
+LOG_CACHE_DIR = os.getenv("LOG_CACHE_DIR", default="creepts/log-cache/")
+LOG_CACHE_DISK_SIZE = int(os.getenv("LOG_CACHE_DISK_SIZE", default="1024"))
+#Seconds clients may keep a log response once its score is final
+LOG_CACHE_MAX_AGE = int(os.getenv("LOG_CACHE_MAX_AGE", default=str(365 * 24 * 3600)))
+
+#Whether the opponent and winner logs are downloaded into the log cache as soon as they are known
+LOG_PREFETCH_ENABLED = os.getenv("LOG_PREFETCH_ENABLED", default="true").lower() in ("1", "true", "yes")
+#Maximum number of logs being prefetched at once, and seconds before retrying a failed one
+LOG_PREFETCH_MAX_IN_FLIGHT = int(os.getenv("LOG_PREFETCH_MAX_IN_FLIGHT", default="2"))
+LOG_PREFETCH_RETRY_INTERVAL = float(os.getenv("LOG_PREFETCH_RETRY_INTERVAL", default="30"))
+
+#Seconds between logger polls of a log being downloaded for waiting clients
+LOG_DOWNLOAD_POLL_INTERVAL = float(os.getenv("LOG_DOWNLOAD_POLL_INTERVAL", default="1"))
+#Maximum seconds a scores request waits for a pending log (?wait=N), and an event stream stays open,
+#both must stay below the gunicorn worker timeout of the image
+LOG_DOWNLOAD_MAX_WAIT = float(os.getenv("LOG_DOWNLOAD_MAX_WAIT", default="25"))
+LOG_DOWNLOAD_STREAM_TIMEOUT = float(os.getenv("LOG_DOWNLOAD_STREAM_TIMEOUT", default="300"))
+#Maximum number of requests waiting or streaming at once per process, each holds a worker thread,
+#so it must stay below the gunicorn threads of the image, the others are answered right away
+LOG_DOWNLOAD_MAX_WAITERS = int(os.getenv("LOG_DOWNLOAD_MAX_WAITERS", default="8"))
+
 #MERKLE TREE ROOT HASH CALCULATOR BINARY
 HASH_BINARY_CMD = os.getenv("HASH_BINARY_CMD", default="cartesi-machine-hash")
 
 #PACK LOG RELATED
 PACKED_LOG_EXT = "br.cpio"
 PACKLOG_CMD = os.getenv("PACKLOG_CMD", default="./packlog")
+#Name, permissions and modification time (2000-01-01 00:00 UTC) of the
+#compressed log inside the archive, the same ones the packlog script sets
+PACKED_LOG_MEMBER_NAME = "log.json.br"
+PACKED_LOG_MEMBER_MODE = 0o100644
+PACKED_LOG_MEMBER_MTIME = 946684800
 UNPACKLOG_CMD = os.getenv("UNPACKLOG_CMD", default="./unpacklog")
 
 #TRUNCATE RELATED
 DEFAULT_TRUNCATE_SIZE="1M"
-TRUNCATE_BIN="truncate"
 
 #DISPATCHER RELATED
 DISPATCHER_URL = os.getenv("DISPATCHER_URL", default="http://dispatcher:3001")
 COMMIT_LOG_URL = DISPATCHER_URL
+DISPATCHER_REQUEST_TIMEOUT = float(os.getenv("DISPATCHER_REQUEST_TIMEOUT", default="10"))
+DISPATCHER_POOL_CONNECTIONS = int(os.getenv("DISPATCHER_POOL_CONNECTIONS", default="4"))
+DISPATCHER_POOL_SIZE = int(os.getenv("DISPATCHER_POOL_SIZE", default="16"))
+DISPATCHER_MAX_RETRIES = int(os.getenv("DISPATCHER_MAX_RETRIES", default="3"))
+DISPATCHER_RETRY_BACKOFF = float(os.getenv("DISPATCHER_RETRY_BACKOFF", default="0.2"))
+
+#TOURNAMENT FETCHING RELATED
+#Maximum number of tournaments being fetched from the dispatcher and blockchain at once, 1 fetches serially
+FETCHER_MAX_IN_FLIGHT = int(os.getenv("FETCHER_MAX_IN_FLIGHT", default="8"))
+
+#Whether identical concurrent dispatcher, blockchain and logger calls are collapsed into a single one
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", default="true").lower() in ("1", "true", "yes")
+
+#Seconds between refreshes of the in-memory tournaments snapshot served by the resources
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", default="5"))
 
 #LOGGING RELATED
 LOGGING_CONFIG_FILENAME = "creepts/logging.conf"
@@ -96,6 +185,26 @@ MAPPED_MAP_INFO_FILENAME = "creepts/map_info.yaml"
 TOURNAMENTS_RESPONSE_LIMIT = 100
 
 #BLOCKCHAIN RELATED
+#Seconds during which the latest known block is reused before asking the node again, contract reads are cached per block
+BLOCK_CHECK_INTERVAL = float(os.getenv("BLOCK_CHECK_INTERVAL", default="1"))
+#Ethereum node uri, reads of many tournaments are sent to it in JSON-RPC batches when it is http based
+WEB3_PROVIDER_URI = os.getenv("WEB3_PROVIDER_URI", default="")
+WEB3_REQUEST_TIMEOUT = float(os.getenv("WEB3_REQUEST_TIMEOUT", default="10"))
+#Address of a deployed Multicall contract, if any, to aggregate reads in a single eth_call instead
+MULTICALL_ADDRESS = os.getenv("MULTICALL_ADDRESS", default="")
+#Whether the tournaments listing reads the blockchain information of all tournaments in a single batch
+BLOCKCHAIN_BATCH_READS = os.getenv("BLOCKCHAIN_BATCH_READS", default="true").lower() in ("1", "true", "yes")
+#Whether scores, hashes and player counts are served from a local index fed by the RevealInstantiator events
+CHAIN_INDEX_ENABLED = os.getenv("CHAIN_INDEX_ENABLED", default="false").lower() in ("1", "true", "yes")
+CHAIN_INDEX_FROM_BLOCK = int(os.getenv("CHAIN_INDEX_FROM_BLOCK", default="0"))
+CHAIN_INDEX_BLOCK_RANGE = int(os.getenv("CHAIN_INDEX_BLOCK_RANGE", default="5000"))
+CHAIN_INDEX_POLL_INTERVAL = float(os.getenv("CHAIN_INDEX_POLL_INTERVAL", default="1"))
+#Blocks mined on top of a block before its events are indexed, so chain reorganizations don't leave dropped events behind
+CHAIN_INDEX_CONFIRMATIONS = int(os.getenv("CHAIN_INDEX_CONFIRMATIONS", default="6"))
+#Seconds without a successful sync after which the index is ignored and the contract is queried again
+CHAIN_INDEX_MAX_LAG = float(os.getenv("CHAIN_INDEX_MAX_LAG", default="30"))
+CHAIN_INDEX_COMMIT_EVENT = os.getenv("CHAIN_INDEX_COMMIT_EVENT", default="logCommited")
+CHAIN_INDEX_REVEAL_EVENT = os.getenv("CHAIN_INDEX_REVEAL_EVENT", default="logRevealed")
 CONTRACTS_DIR = os.getenv('CONTRACTS_DIR', default=".")
 CONTRACTS_MAPPING = {
     "RevealCommit": "node_modules/@cartesi/tournament/build/contracts/RevealInstantiator.json"
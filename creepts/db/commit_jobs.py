@@ -0,0 +1,120 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import time
+import logging
+from .. import constants as const
+from . import db_utilities
+from . import log_store
+
+LOGGER = logging
+
+#Durable queue of the game log commits to the dispatcher. Jobs are kept in
+#the database, so they survive restarts, and workers hold a lease on the
+#job they run, so the jobs of a crashed worker are picked up again
+
+#Job status
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+#A newer log of the same tournament was queued before the job ran
+SUPERSEDED = "superseded"
+
+def enqueue(tournament_id, log):
+    """Queues the commit of the given log to the given tournament and returns the job id"""
+    log_hash = log_store.put(log)
+    now = time.time()
+
+    with db_utilities.write_transaction() as conn:
+        job_id = conn.execute(const.INSERT_COMMIT_JOB, (str(tournament_id), log_hash, now, now, now)).lastrowid
+        #Only the latest log of a tournament needs to be committed
+        conn.execute(const.SUPERSEDE_PENDING_COMMIT_JOBS, (now, str(tournament_id), job_id))
+
+    LOGGER.info("Queued commit job %d for tournament %s", job_id, tournament_id)
+    return job_id
+
+def claim():
+    """
+    Takes the next job ready to run, returns a dict with its id,
+    tournament_id, log and attempts or None if there is none
+    """
+    now = time.time()
+
+    with db_utilities.write_transaction() as conn:
+        while True:
+            row = conn.execute(const.SELECT_NEXT_COMMIT_JOB, (now, now, now)).fetchone()
+            if not row:
+                return None
+
+            job_id, tournament_id, log_hash, attempts, status = row
+            if status == RUNNING and attempts >= const.COMMIT_JOB_MAX_ATTEMPTS:
+                #Its worker died or hung on every attempt, running it again would do the same
+                conn.execute(const.FINISH_COMMIT_JOB, (FAILED, None, "Lease expired", now, now, job_id))
+                LOGGER.error("Commit job %d lease expired on attempt %d, giving up as %s", job_id, attempts, FAILED)
+                continue
+
+            conn.execute(const.CLAIM_COMMIT_JOB, (now + const.COMMIT_JOB_LEASE, now, job_id))
+            break
+
+    return {"id": job_id, "tournament_id": tournament_id, "log": log_store.get(log_hash), "attempts": attempts + 1}
+
+def complete(job_id, commit_hash):
+    """Records the given job as done, with the merkle root hash committed"""
+    now = time.time()
+    with db_utilities.write_transaction() as conn:
+        conn.execute(const.FINISH_COMMIT_JOB, (DONE, commit_hash, None, now, now, job_id))
+
+def fail(job_id, tournament_id, attempts, error):
+    """
+    Records a failed attempt of the given job, scheduling a retry with
+    exponential backoff until it runs out of attempts
+    """
+    now = time.time()
+    delay = min(const.COMMIT_JOB_RETRY_DELAY * 2 ** (attempts - 1), const.COMMIT_JOB_MAX_RETRY_DELAY)
+
+    with db_utilities.write_transaction() as conn:
+        if conn.execute(const.SELECT_NEWER_COMMIT_JOB, (str(tournament_id), job_id)).fetchone():
+            #A retry would commit an older log over the newer one
+            status = SUPERSEDED
+        elif attempts >= const.COMMIT_JOB_MAX_ATTEMPTS:
+            status = FAILED
+        else:
+            status = PENDING
+
+        conn.execute(const.FINISH_COMMIT_JOB, (status, None, str(error), now + delay, now, job_id))
+
+    if status == PENDING:
+        LOGGER.warning("Commit job %d failed on attempt %d, retrying in %.1fs: %s", job_id, attempts, delay, error)
+    else:
+        LOGGER.error("Commit job %d failed on attempt %d, giving up as %s: %s", job_id, attempts, status, error)
+
+    return status
+
+def get(job_id):
+    """Returns a dict describing the given job or None if there is no such job"""
+    records = db_utilities.execute(const.SELECT_COMMIT_JOB, (job_id,), fetch=True)
+    if not records:
+        return None
+
+    job_id, tournament_id, status, attempts, commit_hash, error, created_at, updated_at = records[0]
+    return {
+        "id": job_id,
+        "tournament_id": tournament_id,
+        "status": status,
+        "attempts": attempts,
+        "hash": commit_hash,
+        "error": error,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
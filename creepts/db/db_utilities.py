@@ -15,57 +15,138 @@ import sqlite3
 import sys
 import os
 import logging
+import threading
+import contextlib
 from .. import constants as const
+from . import migrations
+from . import log_store
 
 LOGGER = logging
 
+#Outcomes of store_best_log_entry
+LOG_ENTRY_CREATED = "created"
+LOG_ENTRY_UPDATED = "updated"
+
+# connections are kept open by thread, sqlite connections can't be shared among them
+_LOCAL = threading.local()
+
 def get_connection():
-    return sqlite3.connect(const.DB_NAME)
+    """
+    Returns the database connection of the calling thread, opening and
+    tuning it on its first use
+    """
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is not None and _LOCAL.key == (os.getpid(), const.DB_NAME):
+        return conn
+
+    conn = sqlite3.connect(const.DB_NAME, timeout=const.DB_BUSY_TIMEOUT)
+
+    # write ahead log lets readers go on while a writer commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous={}".format(const.DB_SYNCHRONOUS))
+    conn.execute("PRAGMA cache_size=-{}".format(const.DB_CACHE_SIZE_KIB))
+    conn.execute("PRAGMA mmap_size={}".format(const.DB_MMAP_SIZE))
+
+    # tracing every statement is only worth it when it gets logged
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        conn.set_trace_callback(LOGGER.debug)
+
+    _LOCAL.conn = conn
+    _LOCAL.key = (os.getpid(), const.DB_NAME)
+    return conn
 
 def execute(sql_statement, statement_args=None, commit=False, fetch=False):
     conn = get_connection()
-    conn.set_trace_callback(LOGGER.debug)
     cursor = conn.cursor()
     ret = None
 
-    if statement_args:
-        cursor.execute(sql_statement, statement_args)
-    else:
-        cursor.execute(sql_statement)
-    if fetch:
-        ret = cursor.fetchall()
-    cursor.close()
-    if commit:
-        conn.commit()
-    conn.close()
+    try:
+        if statement_args:
+            cursor.execute(sql_statement, statement_args)
+        else:
+            cursor.execute(sql_statement)
+        if fetch:
+            ret = cursor.fetchall()
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
     return ret
 
+@contextlib.contextmanager
+def write_transaction():
+    """
+    Runs the block in a transaction holding the database write lock from
+    its start, committed at the end or rolled back on errors
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
 def create_db():
-    LOGGER.info("Creating database %s", const.DB_NAME)
-    execute(const.CREATE_USER_LOG_TABLE, commit=True)
+    LOGGER.info("Creating or upgrading database %s", const.DB_NAME)
+    migrations.migrate(const.DB_NAME)
 
 def insert_log_entry(user_id, tournament_id, score, waves, log):
-    execute(const.INSERT_SINGLE_LOG_TABLE, (user_id, tournament_id, score, waves, log), commit=True)
+    log_hash = log_store.put(log)
+    execute(const.INSERT_SINGLE_LOG_TABLE, (user_id, tournament_id, score, waves, log_hash), commit=True)
 
 def select_log_entry(user_id, tournament_id):
     entry = None
     records = execute(const.SELECT_LOG_TABLE_FROM_USER_AND_TOURNAMENT, (user_id, tournament_id), fetch=True)
     if records:
         if len(records) > 0:
-            entry = records[0]
+            #Replace the log hash by the log itself
+            entry = records[0][:4] + (log_store.get(records[0][4]),)
 
     return entry
 
 def select_log_entries_from_tournaments(tournament_ids):
-    #Transform all given ids in strings and join them in a single string separated by commas
-    tournament_ids_formatted = ", ".join(["'{}'".format(t) for t in tournament_ids])
-    tournament_ids_formatted = "({})".format(tournament_ids_formatted)
-    return execute(const.BASE_SELECT_LOG_TABLE_FROM_TOURNAMENTS + tournament_ids_formatted, fetch=True)
+    #One placeholder per tournament id, ids are stored as strings
+    placeholders = "({})".format(", ".join(["?"] * len(tournament_ids)))
+    return execute(const.BASE_SELECT_LOG_TABLE_FROM_TOURNAMENTS + placeholders, tuple(str(t) for t in tournament_ids), fetch=True)
 
 def update_log_entry(user_id, tournament_id, score, waves, log):
-    execute(const.UPDATE_LOG_TABLE_FOR_USER_AND_TOURNAMENT, (score, waves, log, user_id, tournament_id), commit=True)
+    log_hash = log_store.put(log)
+    execute(const.UPDATE_LOG_TABLE_FOR_USER_AND_TOURNAMENT, (score, waves, log_hash, user_id, tournament_id), commit=True)
+
+def store_best_log_entry(user_id, tournament_id, score, waves, log):
+    """
+    Stores the given entry if the user has none for the tournament yet or if
+    its score is higher than the stored one, all in a single write transaction
+    so concurrent submissions can't overwrite a better score
+
+    Returns LOG_ENTRY_CREATED, LOG_ENTRY_UPDATED or None if the stored score
+    was not lower than the given one
+    """
+    log_hash = log_store.get_hash(log)
+    ret = None
+
+    #Take the write lock before looking at the stored entry
+    with write_transaction() as conn:
+        cursor = conn.execute(const.INSERT_NEW_LOG_TABLE_ENTRY, (user_id, tournament_id, score, waves, log_hash))
+        if cursor.rowcount == 1:
+            ret = LOG_ENTRY_CREATED
+        else:
+            cursor = conn.execute(const.UPDATE_LOG_TABLE_IF_HIGHER_SCORE, (score, waves, log_hash, user_id, tournament_id, score))
+            if cursor.rowcount == 1:
+                ret = LOG_ENTRY_UPDATED
+
+        #Only store the log once an entry references it, a failure rolls the entry back
+        if ret:
+            log_store.put(log)
+
+    return ret
 
-#Create the db and user logs table if it doesn't exist
-if (not os.path.isfile(const.DB_NAME)):
-    create_db()
+#Create the db and user logs table if it doesn't exist, or bring it to the latest schema
+create_db()
 
@@ -0,0 +1,69 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from .. import constants as const
+
+LOGGER = logging
+
+#Content addressed storage of the game logs on disk. Each log is kept once,
+#in a file named by the sha256 of its content, no matter how many database
+#entries reference it
+
+def get_store_dir(db_name = None):
+    """Returns the directory of the store, by default a logs directory next to the database"""
+    if const.LOG_STORE_DIR:
+        return const.LOG_STORE_DIR
+
+    return os.path.join(os.path.dirname(os.path.abspath(db_name or const.DB_NAME)), "logs")
+
+def _get_path(log_hash, store_dir):
+    # spread the files among subdirectories by the first hash byte
+    return os.path.join(store_dir, log_hash[:2], log_hash)
+
+def get_hash(log_bytes):
+    """Returns the hash the given log is stored by"""
+    return hashlib.sha256(log_bytes).hexdigest()
+
+def put(log_bytes, store_dir = None):
+    """Stores the given log, if it isn't already, and returns its hash"""
+    store_dir = store_dir or get_store_dir()
+    log_hash = get_hash(log_bytes)
+    path = _get_path(log_hash, store_dir)
+
+    if os.path.exists(path):
+        LOGGER.debug("Log %s already stored", log_hash)
+        return log_hash
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # write to a temporary file first, so readers never see a partial log
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(log_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    LOGGER.debug("Stored log %s", log_hash)
+    return log_hash
+
+def get(log_hash, store_dir = None):
+    """Returns the content of the log with the given hash"""
+    with open(_get_path(log_hash, store_dir or get_store_dir()), 'rb') as log_file:
+        return log_file.read()
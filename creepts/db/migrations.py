@@ -0,0 +1,93 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import sqlite3
+import logging
+from .. import constants as const
+from . import log_store
+
+LOGGER = logging
+
+#Versioned schema migrations of the database. The version of the last one
+#applied is kept in the sqlite user_version pragma, each migration runs in
+#its own transaction and new ones must only be appended to MIGRATIONS
+
+def _create_user_logs(conn, db_name):
+    conn.execute(const.CREATE_USER_LOG_TABLE)
+
+def _index_user_logs(conn, db_name):
+    # older databases may hold more than one row per user and tournament, keep the best score
+    conn.execute(const.DELETE_DUPLICATED_LOG_TABLE_ENTRIES)
+    conn.execute(const.CREATE_USER_LOG_TOURNAMENT_USER_INDEX)
+    conn.execute(const.CREATE_USER_LOG_TOURNAMENT_SCORES_INDEX)
+
+def _move_logs_to_store(conn, db_name):
+    # rebuild the table referencing each log by its hash in the log store
+    store_dir = log_store.get_store_dir(db_name)
+    conn.execute(const.CREATE_USER_LOG_TABLE_WITH_LOG_HASH)
+
+    rows = conn.execute("SELECT user_id, tournament_id, score, waves, log FROM {}".format(const.USER_LOG_TABLE))
+    for user_id, tournament_id, score, waves, log in rows.fetchall():
+        log_hash = log_store.put(log, store_dir)
+        conn.execute("INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(const.USER_LOG_TABLE_WITH_LOG_HASH), (user_id, tournament_id, score, waves, log_hash))
+
+    conn.execute("DROP TABLE {}".format(const.USER_LOG_TABLE))
+    conn.execute("ALTER TABLE {} RENAME TO {}".format(const.USER_LOG_TABLE_WITH_LOG_HASH, const.USER_LOG_TABLE))
+    conn.execute(const.CREATE_USER_LOG_TOURNAMENT_USER_INDEX)
+    conn.execute(const.CREATE_USER_LOG_TOURNAMENT_SCORES_INDEX)
+
+def _create_commit_jobs(conn, db_name):
+    conn.execute(const.CREATE_COMMIT_JOB_TABLE)
+    conn.execute(const.CREATE_COMMIT_JOB_STATUS_INDEX)
+    conn.execute(const.CREATE_COMMIT_JOB_TOURNAMENT_INDEX)
+
+MIGRATIONS = [
+    (1, _create_user_logs),
+    (2, _index_user_logs),
+    (3, _move_logs_to_store),
+    (4, _create_commit_jobs)
+]
+
+def get_version(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    # databases created before migrations existed have the table but no version
+    if version == 0:
+        table = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (const.USER_LOG_TABLE,)).fetchone()
+        if table:
+            version = 1
+
+    return version
+
+def migrate(db_name = const.DB_NAME):
+    """Brings the given database up to the latest schema version, returns the version"""
+    # autocommit mode, transactions are handled explicitly
+    conn = sqlite3.connect(db_name, timeout=const.DB_BUSY_TIMEOUT, isolation_level=None)
+
+    try:
+        for version, migration in MIGRATIONS:
+            # the write lock makes concurrent workers apply each migration only once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_version(conn) < version:
+                    LOGGER.info("Migrating database %s to version %d", db_name, version)
+                    migration(conn, db_name)
+                    conn.execute("PRAGMA user_version = {}".format(version))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return get_version(conn)
+    finally:
+        conn.close()
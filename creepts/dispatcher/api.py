@@ -11,18 +11,98 @@ CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
 
+import os
+import threading
+import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .contract import Contract
 from .. import constants as const
+from ..utils.single_flight import SingleFlight
+
+LOGGER = logging
+
+# process wide http session shared by every API instance, keyed by the pid
+# so gunicorn workers forked from a preloaded master build their own pool
+_SESSION = None
+_SESSION_PID = None
+_SESSION_LOCK = threading.Lock()
+
+# identical reads sent at once by different threads go to the dispatcher once
+_FLIGHTS = SingleFlight("dispatcher")
+
+def get_session():
+    """
+    Returns the process wide pooled session used to talk to the dispatcher,
+    creating it on the first call of the current process
+    """
+    global _SESSION, _SESSION_PID
+
+    if _SESSION is not None and _SESSION_PID == os.getpid():
+        return _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != os.getpid():
+            retry = Retry(
+                total=const.DISPATCHER_MAX_RETRIES,
+                backoff_factor=const.DISPATCHER_RETRY_BACKOFF,
+                status_forcelist=(502, 503, 504))
+            adapter = HTTPAdapter(
+                pool_connections=const.DISPATCHER_POOL_CONNECTIONS,
+                pool_maxsize=const.DISPATCHER_POOL_SIZE,
+                max_retries=retry)
+
+            session = requests.Session()
+            session.headers.update({'Connection': 'keep-alive'})
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            LOGGER.debug("Created dispatcher session with pool size %d", const.DISPATCHER_POOL_SIZE)
+            _SESSION = session
+            _SESSION_PID = os.getpid()
+
+    return _SESSION
+
+def get_pool_stats():
+    """
+    Returns the connection pool counters of the dispatcher session:
+    - requests: number of requests sent through the pool
+    - misses: number of new connections opened (a TCP handshake each)
+    - hits: number of requests served by a reused keep-alive connection
+    """
+    requests_count = 0
+    connections_count = 0
+
+    session = get_session()
+    for adapter in set(session.adapters.values()):
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools[key]
+            requests_count += pool.num_requests
+            connections_count += pool.num_connections
+
+    return {
+        "requests": requests_count,
+        "hits": max(requests_count - connections_count, 0),
+        "misses": connections_count
+    }
 
 class API:
 
-    def __init__(self, url = const.DISPATCHER_URL):
+    def __init__(self, url = const.DISPATCHER_URL, timeout = const.DISPATCHER_REQUEST_TIMEOUT):
         self.url = url
+        self.timeout = timeout
+
+    @property
+    def session(self):
+        return get_session()
 
     def get_instance_indexes(self):
+        return _FLIGHTS.do(("get_instance_indexes", self.url), self._get_instance_indexes)
+
+    def _get_instance_indexes(self):
         headers = {'Content-type': 'application/json'}
-        response = requests.get(self.url, headers=headers)
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
         # TODO: handle errors
         if (response.status_code == 200):
             return response.json()
@@ -30,10 +110,27 @@ class API:
             return None
 
     def get_instance(self, index):
-        response = requests.get(self.url, json={"Instance": index})
-        
-        # TODO: handle errors
+        return _FLIGHTS.do(("get_instance", self.url, index), self._get_instance, index)
+
+    def _get_instance(self, index):
+        response = self.session.get(self.url, json={"Instance": index}, timeout=self.timeout)
+
+        # there is no instance with the given index
+        if response.status_code == 404:
+            return None
+
+        # TODO: handle other errors
         json_response = response.json()
 
         # instantiate a Contract wrapper class with the json
         return Contract(json_response)
+
+    def post(self, index, payload):
+        """Posts the given payload to the instance with the given index, returns the response"""
+        data = {
+            "Post": {
+                "index": index,
+                "payload": payload
+            }
+        }
+        return self.session.post(self.url, json=data, timeout=self.timeout)
@@ -13,17 +13,62 @@ specific language governing permissions and limitations under the License.
 
 import os
 import grpc
+import threading
 from web3 import Web3
 
 from . import cartesi_base_pb2
 from . import logger_high_pb2
 from . import logger_high_pb2_grpc
 
-from ..constants import LOGGER_URL, LOGGER_DATA_DIR, LOG_FILES_OUTPUT_DIR, PACKED_LOG_EXT, DEFAULT_PAGE_LOG2_BYTES_SIZE, DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE
+from .. import constants as const
+from ..utils.single_flight import SingleFlight
+from ..constants import LOGGER_DATA_DIR, LOG_FILES_OUTPUT_DIR, PACKED_LOG_EXT, DEFAULT_PAGE_LOG2_BYTES_SIZE, DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE
+
+# channel and stub shared by the whole process, grpc channels are thread safe,
+# connect on their first call and reconnect by themselves when the logger goes away
+_CHANNEL = None
+_STUB = None
+_PID = None
+_LOCK = threading.Lock()
+
+# the prefetcher and the waiting clients asking for the same log at once make a single request
+_FLIGHTS = SingleFlight("logger")
+
+def get_stub():
+    """Returns the process wide logger stub, creating its channel on first use"""
+    global _CHANNEL, _STUB, _PID
+
+    if _STUB is not None and _PID == os.getpid():
+        return _STUB
+
+    with _LOCK:
+        # a channel inherited through a fork can't be used, the child creates its own
+        if _STUB is None or _PID != os.getpid():
+            _CHANNEL = grpc.insecure_channel(const.LOGGER_URL, options=[
+                ('grpc.keepalive_time_ms', int(const.LOGGER_KEEPALIVE_TIME * 1000)),
+                ('grpc.keepalive_timeout_ms', int(const.LOGGER_KEEPALIVE_TIMEOUT * 1000)),
+                ('grpc.keepalive_permit_without_calls', 1),
+                ('grpc.http2.max_pings_without_data', 0)])
+            _STUB = logger_high_pb2_grpc.LoggerManagerHighStub(_CHANNEL)
+            _PID = os.getpid()
+
+    return _STUB
+
+def close_channel():
+    """Closes the process wide channel, the next call opens a new one"""
+    global _CHANNEL, _STUB, _PID
+
+    with _LOCK:
+        if _CHANNEL is not None and _PID == os.getpid():
+            _CHANNEL.close()
+        _CHANNEL = _STUB = _PID = None
 
 class LoggerClient:
 
     def download(self, commit_hash):
+        return _FLIGHTS.do(commit_hash, self._download, commit_hash)
+
+    def _download(self, commit_hash):
         # use the hash as base name of file
         filename = '{}.json'.format(commit_hash)
 
@@ -33,11 +78,8 @@ class LoggerClient:
         # build the path the logger will store the file (may be different, because it's a different container/filesystem)
         logger_path = os.path.join(LOGGER_DATA_DIR, '{}.{}'.format(filename, PACKED_LOG_EXT))
 
-        # create channel, maybe need to do this only once?
-        channel = grpc.insecure_channel(LOGGER_URL)
-
-        # create the stub (only once?)
-        stub = logger_high_pb2_grpc.LoggerManagerHighStub(channel)
+        # shared by every call
+        stub = get_stub()
 
         # request file
         request = logger_high_pb2.DownloadFileRequest(
@@ -47,7 +89,7 @@ class LoggerClient:
             tree_log2_size=DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE
         )
 
-        response = stub.DownloadFile(request)
+        response = stub.DownloadFile(request, timeout=const.LOGGER_REQUEST_TIMEOUT)
 
         # path
         # progress
@@ -12,51 +12,65 @@ specific language governing permissions and limitations under the License.
 """
 
 import logging
-from ..utils import blockchain_utils
+from web3 import Web3
+from ..utils import blockchain_utils, chain_index
 
 class BlockchainDecorator:
 
     def apply(self, dapp, tournament):
+        self.apply_all([(dapp, tournament)])
+
+        return
+
+    def apply_all(self, dapps_and_tournaments):
+        """
+        Decorates every given (dapp, tournament) pair with the number of players
+        and the scores and hashes of the opponent and winner, reading all of them
+        from the blockchain in a single batch
+        """
+
+        # collect every contract read needed, and where its result goes
+        calls = []
+        targets = []
+        for dapp, tournament in dapps_and_tournaments:
+            calls.append((dapp, "getNumberOfPlayers", ()))
+            targets.append((tournament, None, "playerCount"))
+
+            # getting winner and current opponent score if available
+            for player in (tournament.winner, tournament.currentOpponent):
+                if player:
+                    calls.append((dapp, "getScore", (player,)))
+                    targets.append((tournament, player, "score"))
+                    calls.append((dapp, "getLogHash", (player,)))
+                    targets.append((tournament, player, "hash"))
 
-        # get number of players from blockchain
         try:
-            tournament.playerCount = blockchain_utils.get_number_of_players(dapp)
+            results = self._read(calls)
         except Exception as e:
-            # log exception and set value to 0
-            logging.error("Failed to recover number of players in tournament %d. Details:", tournament.id)
+            logging.error("Failed to recover number of players, scores or hashes of tournaments %s. Details:", [t.id for _, t in dapps_and_tournaments])
             logging.exception(e)
             raise e
 
-        # get scores from blockchain (opponent and winner)
-        self._fetch_scores_from_blockchain(dapp, tournament)
+        # fan the results back into the tournaments
+        scores = {}
+        for (tournament, player, field), value in zip(targets, results):
+            if field == "playerCount":
+                tournament.playerCount = value
+            else:
+                if field == "hash":
+                    # convert to hex string
+                    value = Web3.toHex(value)
+                scores.setdefault(tournament.id, {}).setdefault(player, {})[field] = value
 
-        return
-    
-    def _fetch_scores_from_blockchain(self, dapp, tournament):
-        scores={}
-        # getting winner score if available
-        if tournament.winner:
-            try:
-                winner_score = blockchain_utils.get_player_score(dapp, tournament.winner)
-                commit_hash = blockchain_utils.get_player_hash(dapp, tournament.winner)
-                scores[tournament.winner] = { "score": winner_score, "hash": commit_hash }
-            except Exception as e:
-                # log exception and keep trying to recover other scores
-                logging.error("Failed to recover score or hash from player %s and tournament %d. Details:", tournament.winner, tournament.id)
-                logging.exception(e)
-                raise e
-
-        # getting current opponent score if available
-        if tournament.currentOpponent:
-            try:
-                opponent_score = blockchain_utils.get_player_score(dapp, tournament.currentOpponent)
-                commit_hash = blockchain_utils.get_player_hash(dapp, tournament.currentOpponent)
-                scores[tournament.currentOpponent] = { "score": opponent_score, "hash": commit_hash }
-            except Exception as e:
-                #Log exception and keep trying to recover other scores
-                logging.error("Failed to recover score or hash from player %s and tournament %d. Details:", tournament.currentOpponent, tournament.id)
-                logging.exception(e)
-                raise e
-
-        # merge old scores with the new ones
-        tournament.scores={**tournament.scores, **scores}
+        for _, tournament in dapps_and_tournaments:
+            # merge old scores with the new ones
+            tournament.scores = {**tournament.scores, **scores.get(tournament.id, {})}
+
+    def _read(self, calls):
+        """Reads the given calls from the chain index when it is up to date, from the node otherwise"""
+        index = chain_index.get_index()
+
+        if index is not None and index.is_synced():
+            return [index.read(dapp, function_name, args) for dapp, function_name, args in calls]
+
+        return blockchain_utils.batch_call(calls)
@@ -11,7 +11,9 @@ CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
 
+import os
 import yaml
+import threading
 
 from datetime import datetime, timezone
 import logging
@@ -22,6 +24,29 @@ from web3 import Web3
 class TournamentMappingException(Exception):
     pass
 
+# parsed static information files by filename, as (mtime, data)
+YAML_CACHE = {}
+_YAML_CACHE_LOCK = threading.Lock()
+
+def load_yaml(filename):
+    """
+    Returns the parsed content of the given yaml file, parsing it again
+    only when its modification time changes
+    """
+    mtime = os.stat(filename).st_mtime_ns
+
+    cached = YAML_CACHE.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _YAML_CACHE_LOCK:
+        with open(filename) as yaml_file:
+            data = yaml.full_load(yaml_file)
+        logging.debug("Loaded static information file %s", filename)
+        YAML_CACHE[filename] = (mtime, data)
+
+    return data
+
 class Mapper:
 
     def __init__(self, address):
@@ -31,6 +56,12 @@ class Mapper:
         # store address
         self.address = address
 
+    @staticmethod
+    def preload():
+        """Parses the static tournament and map information files ahead of the first mapping"""
+        load_yaml(MAPPED_TOURNAMENT_INFO_FILENAME)
+        load_yaml(MAPPED_MAP_INFO_FILENAME)
+
     def to_tournament(self, dapp):
         #Should be DApp at first, when removing the test part of the dapp this
         #first level should disappear and start from the "AnutoDapp" level
@@ -142,26 +173,24 @@ class Mapper:
         name = None
         #At the time this is comming from a static file, but should come from the blockchain in the future
         #Loading yaml with the mapped information
-        with open(MAPPED_TOURNAMENT_INFO_FILENAME) as tour_info_file:
-            tour_info = yaml.full_load(tour_info_file)
-            id = dapp.index
+        tour_info = load_yaml(MAPPED_TOURNAMENT_INFO_FILENAME)
+        id = dapp.index
 
-            if id in tour_info.keys():
-                if "name" in tour_info[id].keys():
-                    name = tour_info[id]["name"]
+        if id in tour_info.keys():
+            if "name" in tour_info[id].keys():
+                name = tour_info[id]["name"]
 
         return name
 
     def _get_map_name(self, dapp):
         name = None
         #Loading yaml with the mapped information
-        with open(MAPPED_MAP_INFO_FILENAME) as map_info_file:
-            map_info = yaml.full_load(map_info_file)
-            if 'level' in dapp.data.keys():
-                lvl = dapp['level']
-
-                if lvl in map_info.keys():
-                    if "name" in map_info[lvl].keys():
-                        name = map_info[lvl]["name"]
+        map_info = load_yaml(MAPPED_MAP_INFO_FILENAME)
+        if 'level' in dapp.data.keys():
+            lvl = dapp['level']
+
+            if lvl in map_info.keys():
+                if "name" in map_info[lvl].keys():
+                    name = map_info[lvl]["name"]
 
         return name
@@ -0,0 +1,63 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import falcon
+import json
+import logging
+
+from ..db import commit_jobs
+
+LOGGER = logging
+
+class CommitJobs:
+
+    def on_get(self, req, resp, job_id):
+        """
+        Handles the get method for the status of a log commit job
+
+        Parameters
+        ----------
+        req : falcon.Request
+            Contains the request, this method has no input parameters
+
+        resp: falcon.Response
+            This object is used to issue the response to this call,
+            if no error occurs, it returns a structure with the job
+            id, tournament id, status (pending, running, done, failed
+            or superseded), number of attempts, the committed hash once
+            done and the error of the last failed attempt
+            if there is no job with the given id, returns 404
+
+        job_id : str
+            The id of the desired job, as returned by the score submission
+
+        Returns
+        -------
+
+        NoneType
+            This method has no return
+        """
+
+        try:
+            job = commit_jobs.get(int(job_id))
+        except ValueError:
+            raise falcon.HTTPNotFound(description="No commit job found with the provided id: {}".format(job_id))
+        except Exception as e:
+            LOGGER.exception(e)
+            raise falcon.HTTPInternalServerError(description="Failed recovering commit job")
+
+        if not job:
+            raise falcon.HTTPNotFound(description="No commit job found with the provided id: {}".format(job_id))
+
+        resp.body = json.dumps(job)
+        resp.status = falcon.HTTP_200
@@ -15,21 +15,35 @@ import falcon
 import json
 import traceback
 import sys
-import requests
 import logging
 import os
+import time
 
 from .. import constants as const
-from ..utils import game_log_utils, hash_utils, blockchain_utils
-from ..db import db_utilities
+from ..utils import game_log_utils, blockchain_utils
+from ..db import db_utilities, commit_jobs
 from ..logger import LoggerClient
 from ..utils import tournament_recovery_utils as tru
+from ..utils import tournament_snapshot
+from ..utils import commit_worker
+from ..utils import log_cache
+from ..utils import log_prefetcher
+from ..utils import log_downloads
 from ..model.tournament import TournamentPhase
 
 class Scores:
 
     def __init__(self, address):
         self.tournaments_fetcher = tru.Fetcher(address)
+        self.commit_workers = commit_worker.get_workers()
+        self.snapshot_poller = tournament_snapshot.get_poller(address)
+        self.log_cache = log_cache.get_cache()
+        self.log_downloads = log_downloads.get_downloads(self.log_cache, LoggerClient().download)
+
+        if const.LOG_PREFETCH_ENABLED:
+            #Warm the log cache with the opponent and winner logs of every new snapshot
+            prefetcher = log_prefetcher.get_prefetcher(self.log_cache, LoggerClient().download)
+            self.snapshot_poller.add_listener(prefetcher.on_snapshot)
 
     def on_put_my(self, req, resp, tournament_id):
         """
@@ -42,8 +56,9 @@ class Scores:
 
         resp: falcon.Response
             This object is used to issue the response to this call,
-            if no error occurs, it returns a 204 if there was a score
-            and it was improved and a 201 if it is the 1st score stored
+            if no error occurs, it stores the score and returns a 202
+            with the id of the job committing the log in background,
+            its status is served by the /api/jobs/{job_id} resource
             if there is already a log with better score, it returns
             a 409 - Conflict, you already have a better score response
             if the tournament is not accepting logs, it returns
@@ -90,9 +105,10 @@ class Scores:
         # this is for testing purposes, in the future we may support a real read-only mode, including the 
         # front-end in the process, with proper user feedback
         if const.READ_ONLY:
-            logging.info("Server in read-only mode, returning 201 and not submitting log")
-            resp.body = json.dumps({"title":"201 Created","description":"Server in read-only mode"})
-            resp.status = falcon.HTTP_201
+            logging.info("Server in read-only mode, returning 202 and not submitting log")
+            #Same answer as a queued commit, without a job to follow
+            resp.body = json.dumps({"title":"202 Accepted","description":"Server in read-only mode","job_id":None})
+            resp.status = falcon.HTTP_202
             return
 
         #Checking the tournament is in the commit phase
@@ -111,33 +127,29 @@ class Scores:
             waves = req_json['waves']
             log_bytes = json.dumps(req_json['log']).encode()
 
-            #Check if there is already a score and log for this tournament in db
-            log_entry = db_utilities.select_log_entry(user_id, tournament_id)
-
-            if log_entry:
-                previous_score = log_entry[2]
-                #Check if score is higher than the one stored
-                if (score > previous_score):
-                    #It is, store it
-                    db_utilities.update_log_entry(user_id, tournament_id, score, waves, log_bytes)
-                    #Commit the log
-                    error = self._commit_log(tournament_id, log_bytes)
-                    if error:
-                        raise
-                    resp.status = falcon.HTTP_204
-                else:
-                    #It isn't return 409
-                    error = falcon.HTTPConflict(description="The given score is not higher than a previously submitted one")
-                    raise
+            #Store the entry if it is the first one or improves the stored score
+            stored = db_utilities.store_best_log_entry(user_id, tournament_id, score, waves, log_bytes)
+
+            if not stored:
+                #The stored score is as high or higher, return 409
+                error = falcon.HTTPConflict(description="The given score is not higher than a previously submitted one")
+                raise
+
+            #Queue the log commit, the workers run it in background
+            job_id = commit_jobs.enqueue(tournament_id, log_bytes)
+            self.commit_workers.notify()
+
+            #Make the new score visible without waiting for the next snapshot refresh
+            self.snapshot_poller.update_score(tournament_id, user_id, {"score":score, "waves":waves})
+
+            if stored == db_utilities.LOG_ENTRY_CREATED:
+                description = "Score, wave number and log were created for tournament {}, log commit queued".format(tournament_id)
             else:
-                #No previous entry, store
-                db_utilities.insert_log_entry(user_id, tournament_id, score, waves, log_bytes)
-                #Commit the log
-                error = self._commit_log(tournament_id, log_bytes)
-                if error:
-                    raise
-                resp.body = json.dumps({"title":"201 Created","description":"Score, wave number and log were created for tournament {}".format(tournament_id)})
-                resp.status = falcon.HTTP_201
+                description = "Score, wave number and log were updated for tournament {}, log commit queued".format(tournament_id)
+
+            resp.body = json.dumps({"title":"202 Accepted","description":description,"job_id":job_id})
+            resp.location = "/api/jobs/{}".format(job_id)
+            resp.status = falcon.HTTP_202
 
         except Exception as e:
             if error:
@@ -229,8 +241,13 @@ class Scores:
             if not blockchain_utils.is_address(player_id):
                 raise falcon.HTTPBadRequest(description="Provided player address is not a valid Ethereum address: {}".format(player_id))
 
-            #Check if there is a tournament with this id
-            tour = self.tournaments_fetcher.get_tournament(tournament_id)
+            #Check if there is a tournament with this id in the latest snapshot
+            snapshot = self.snapshot_poller.get_snapshot()
+            tour = snapshot.get(tournament_id)
+
+            if not tour:
+                #It may have been created after the snapshot, check the dispatcher
+                tour = self.tournaments_fetcher.get_tournament(tournament_id)
 
             if not tour:
                 #Not found, return 404
@@ -250,33 +267,52 @@ class Scores:
 
             # commit hash
             commit_hash = tour.scores[player_id]['hash']
+            score = tour.scores[player_id]['score']
 
-            # download file (or initiates a download)
-            logger_client = LoggerClient()
-            response = logger_client.download(commit_hash)
+            # the log of a commit hash never changes, serve it from the cache when possible
+            log_json = self.log_cache.get(commit_hash)
 
-            if response['status'] == 0:
-                # 0 -> finished successfully
-                resp_dict = {}
-                resp_dict['score'] = tour.scores[player_id]['score']
-
-                # load json into object
-                log_filename = hash_utils.unpack_log_file(response['path'])
-                if log_filename is None:
-                    raise falcon.HTTPInternalServerError(description="Could not unpack file")
+            # streams and long waits hold a request thread, past their limit clients are answered right away
+            if log_json is None and "text/event-stream" in (req.accept or "") and self.log_downloads.hold():
+                # push the download progress, and then the log, as server-sent events
+                resp.content_type = "text/event-stream"
+                resp.cache_control = ["no-cache"]
+                resp.stream = _EventStream(self._log_events(commit_hash, score), self.log_downloads.release)
+                resp.status = falcon.HTTP_200
+                return
+
+            if log_json is None:
+                # wait up to ?wait=N seconds for the log, downloaded once however many clients wait for it
+                wait = min(req.get_param_as_float('wait', min_value=0, default=0), const.LOG_DOWNLOAD_MAX_WAIT)
+                held = wait > 0 and self.log_downloads.hold()
+                try:
+                    log_json, progress = self.log_downloads.wait(commit_hash, wait if held else 0)
+                finally:
+                    if held:
+                        self.log_downloads.release()
+
+                if log_json is None:
+                    # working on it, not ready yet
+                    resp.body = json.dumps({ 'progress': progress })
+                    resp.status = falcon.HTTP_202
+                    tournament_snapshot.set_staleness_headers(resp, self.snapshot_poller, snapshot)
+                    return
+
+            # the score is only final once revealed, so it is part of the validator
+            resp.etag = "{}-{}".format(commit_hash, score)
+            if tour.phase in (TournamentPhase.ROUND, TournamentPhase.END):
+                resp.cache_control = ["public", "max-age={}".format(const.LOG_CACHE_MAX_AGE), "immutable"]
+            else:
+                resp.cache_control = ["no-cache"]
+            tournament_snapshot.set_staleness_headers(resp, self.snapshot_poller, snapshot)
 
-                # load json object from file
-                with open(log_filename) as json_file:
-                    log = json.load(json_file)
+            if_none_match = req.if_none_match or []
+            if "{}-{}".format(commit_hash, score) in if_none_match or "*" in if_none_match:
+                resp.status = falcon.HTTP_304
+                return
 
-                resp_dict['log'] = log
-                resp.body = json.dumps(resp_dict)
-                resp.status = falcon.HTTP_200
-                
-            elif response['status'] == 1:
-                # 1 -> working on it, not ready yet
-                resp.body = json.dumps({ 'progress': response['progress'] })
-                resp.status = falcon.HTTP_202
+            resp.body = _score_body(score, log_json)
+            resp.status = falcon.HTTP_200
 
         except Exception as e:
             logging.exception(e)
@@ -287,56 +323,51 @@ class Scores:
             else:
                 raise falcon.HTTPInternalServerError(description=str(e))
 
-    def _commit_log(self, tournament_id, game_log):
-        #Write log to file with the tournament_id as name
-        log_filename = "{}{}.json".format(const.LOG_FILES_OUTPUT_DIR, tournament_id)
-        logging.info("Writting log with filename %s", log_filename)
-
-        with open(log_filename, 'wb') as log_file:
-            log_file.write(game_log)
-
-        #Compress and archive the log
-        packed_log_filename = hash_utils.pack_log_file(log_filename)
-
-        if not packed_log_filename:
-            logging.error("Failed to pack the log file")
-            return falcon.HTTPInternalServerError(description="Error compressing and archiving game log file")
-
-        logging.info("Packed log filename is %s", packed_log_filename)
-
-        #Truncate file to the expected final size
-        success = hash_utils.truncate_file(packed_log_filename)
-
-        if not success:
-            logging.error("Failed to truncate log file")
-            return falcon.HTTPInternalServerError(description="Error truncating compressed and archived game log file to correct size")
+    def _log_events(self, commit_hash, score):
+        """Yields the progress of the given log download as server-sent events, and then the log itself"""
+        deadline = time.monotonic() + const.LOG_DOWNLOAD_STREAM_TIMEOUT
+        # any progress reported by the logger is news
+        progress = -1
+        try:
+            while time.monotonic() < deadline:
+                log_json, new_progress = self.log_downloads.wait(commit_hash, const.LOG_DOWNLOAD_MAX_WAIT, progress)
 
-        #Calculate the merkle tree root hash of it
-        calculated_hash = hash_utils.merkle_root_hash(packed_log_filename)
+                if log_json is not None:
+                    yield _event("log", _score_body(score, log_json))
+                    return
 
-        if not calculated_hash:
-            logging.error("Failed to calculate the hash of the provided file")
-            return falcon.HTTPInternalServerError(description="Error calculating the merkle root hash of the compressed, archieved and truncated game log file")
+                if new_progress != progress:
+                    progress = new_progress
+                    yield _event("progress", json.dumps({ 'progress': progress }))
+                else:
+                    # keep proxies from closing the idle stream
+                    yield b": keepalive\n\n"
+            # closed, the client reconnects and resumes waiting
+        except Exception as e:
+            logging.exception(e)
+            yield _event("error", json.dumps({ 'description': str(e) }))
 
-        #Format the post payload
-        payload = {
-            "action": "commit",
-            "params": {
-                "hash": calculated_hash
-            }
-        }
-        data = {
-            "Post": {
-            "index": int(tournament_id),
-            "payload": json.dumps(payload)
-            }
-        }
+class _EventStream:
+    """Response stream of the given events, the wsgi server closes it when done or when the client goes away"""
 
-        #Commit the game log
-        logging.debug("Committing log to the dispatcher")
-        dispatcher_resp = requests.post(const.COMMIT_LOG_URL, json=data)
+    def __init__(self, events, on_close):
+        self.events = events
+        self.on_close = on_close
 
-        if (dispatcher_resp.status_code != 200):
-            logging.error("Failed to commit gamelog for tournament id {} and game log file name {}. Response content was {}".format(tournament_id, packed_log_filename, dispatcher_resp.text))
-            return falcon.HTTPInternalServerError(description="Failed to commit the gamelog for tournament id {} and game log filename {}".format(tournament_id, packed_log_filename))
+    def __iter__(self):
+        return self.events
 
+    def close(self):
+        try:
+            self.events.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+                self.on_close = None
+
+def _score_body(score, log_json):
+    # same as dumping the score and the log together, without serializing the log again
+    return '{{"score": {}, "log": {}}}'.format(json.dumps(score), log_json)
+
+def _event(name, data):
+    return "event: {}\ndata: {}\n\n".format(name, data).encode()
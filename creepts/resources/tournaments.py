@@ -20,6 +20,7 @@ from datetime import datetime
 import pytz
 from .. import constants as const
 from ..utils import tournament_recovery_utils as tru
+from ..utils import tournament_snapshot
 from ..model.tournament import TournamentJSONEncoder, TournamentPhase
 
 LOGGER = logging
@@ -27,6 +28,7 @@ LOGGER = logging
 class Tournaments:
     def __init__(self, address):
         self.tournaments_fetcher = tru.Fetcher(address)
+        self.snapshot_poller = tournament_snapshot.get_poller(address)
 
     def on_get(self, req, resp):
         """
@@ -48,12 +50,18 @@ class Tournaments:
                 Sort criteria of returned tournaments
             - order_by: str ->  Enum:"asc" "desc"
                 Ascendent or descendent order of returned tournaments. Default is asc
+            - cursor: str
+                The next cursor of a previous response, returns the tournaments
+                following its last one, offset counts from there
 
         resp: falcon.Response
             This object is used to issue the response to this call it,
             if no error occurs, it should return a structure describing the
             tournaments similar to the one available in:
             <project_root>/reference/anuto/examples/tournaments.json
+            with the cursor of the next page, if any, in next
+            The X-Snapshot-Age and X-Snapshot-Error headers tell how old the
+            served tournaments snapshot is and why its last refresh failed
 
         Returns
         -------
@@ -67,59 +75,52 @@ class Tournaments:
             if (req.params["phase"] not in valid_values):
                 raise falcon.HTTPBadRequest(description="Invalid phase filter provided, valid values are {}".format(valid_values))
 
+        #Checking the sorting parameters too
+        sort_by = req.get_param("sort_by")
+        if sort_by is not None and sort_by not in tournament_snapshot.ORDERINGS:
+            raise falcon.HTTPBadRequest(description="Invalid sort_by provided, valid values are {}".format(list(tournament_snapshot.ORDERINGS)))
+
+        order_by = req.get_param("order_by", default="asc")
+        if order_by not in ("asc", "desc"):
+            raise falcon.HTTPBadRequest(description="Invalid order_by provided, valid values are ['asc', 'desc']")
+
+        #Pages are taken straight from the sorted tournaments, without negative offsets or limits
+        offset = req.get_param_as_int("offset", min_value=0, default=0)
+        limit = req.get_param_as_int("limit", min_value=0, default=const.TOURNAMENTS_RESPONSE_LIMIT)
+
+        #A cursor continues after the last tournament of a previous page, wherever it is now
+        after = None
+        if req.has_param("cursor"):
+            try:
+                cursor_sort_by, cursor_descending, after = tournament_snapshot.decode_cursor(req.get_param("cursor"))
+            except ValueError as e:
+                raise falcon.HTTPBadRequest(description=str(e))
+
+            if (cursor_sort_by, cursor_descending) != (sort_by, order_by == "desc"):
+                raise falcon.HTTPBadRequest(description="The provided cursor was not issued for these sort_by and order_by")
+
         try:
             LOGGER.info("Get tournaments")
-            #Recoverign all tournaments from dispatcher
-            tournaments = self.tournaments_fetcher.get_all_tournaments()
-
-            #Recovering scores from db and blockchain
-            tournaments = self.tournaments_fetcher.populate_scores_from_db(tournaments)
-
-            filtered_tournaments = []
-
-            #If no filter, return all
-            if ((not req.has_param("phase")) and (not req.has_param("me"))):
-                filtered_tournaments = tournaments
-
-            else:
-                #There is a filter, filtering
-                for tour in tournaments:
-                    #If there is a phase parameter, exclude the ones not matching
-                    if req.has_param("phase"):
-                        if (str(tour.phase.value) != req.params["phase"]):
-                            continue
-
-                    #if there is a me parameter, exclude the ones not matching
-                    if req.has_param("me"):
-                        if req.params["me"] == "true":
-                            #Exclude if doesn't match
-                            if const.PLAYER_OWN_ADD not in tour.scores.keys():
-                                continue
-                        elif req.params["me"] == "false":
-                            #Exclude if matches
-                            if const.PLAYER_OWN_ADD in tour.scores.keys():
-                                continue
-
-                    filtered_tournaments.append(tour)
-
-            #TODO: sort and order by desc/asc
-            #Build response dict with the filtered tournaments
-            resp_dict = {}
+            #Recovering all tournaments, with scores from db and blockchain, from the latest snapshot
+            snapshot = self.snapshot_poller.get_snapshot()
 
-            offset = 0
-            if req.has_param("offset"):
-                offset = int(req.params["offset"])
+            #If there is a me parameter, keep the ones the player is in, or the ones it isn't in
+            me = {"true": True, "false": False}.get(req.get_param("me"))
 
-            limit = const.TOURNAMENTS_RESPONSE_LIMIT
-            if req.has_param("limit"):
-                limit = int(req.params["limit"])
+            #The snapshot keeps the tournaments indexed by phase and participation, and sorted by every sort_by criteria
+            page, next_key = snapshot.page(req.get_param("phase"), me, sort_by, order_by == "desc", after, offset, limit)
+
+            #Build response dict with the filtered tournaments
+            resp_dict = {}
 
             resp_dict["limit"] = limit
             resp_dict["offset"] = offset
-            resp_dict["results"] = filtered_tournaments[offset:offset+limit]
+            resp_dict["next"] = tournament_snapshot.encode_cursor(sort_by, order_by == "desc", next_key) if next_key else None
+            resp_dict["results"] = page
 
             resp.body = json.dumps(resp_dict, cls=TournamentJSONEncoder)
             resp.status = falcon.HTTP_200
+            tournament_snapshot.set_staleness_headers(resp, self.snapshot_poller, snapshot)
 
         except Exception as e:
             LOGGER.exception(e)
@@ -150,20 +151,26 @@ class Tournaments:
         """
 
         try:
-            #Recoverign tournament from dispatcher, if it exists
-            tour = self.tournaments_fetcher.get_tournament(tournament_id)
+            #Recovering tournament, with scores from db and blockchain, from the latest snapshot
+            snapshot = self.snapshot_poller.get_snapshot()
+            tour_with_scores = snapshot.get(tournament_id)
+
+            if not tour_with_scores:
+                #It may have been created after the snapshot, recovering it from dispatcher, if it exists
+                tour = self.tournaments_fetcher.get_tournament(tournament_id)
 
-            if not tour:
-                #No matches, return 404
-                raise falcon.HTTPNotFound(description="No tournament with the provided id")
+                if not tour:
+                    #No matches, return 404
+                    raise falcon.HTTPNotFound(description="No tournament with the provided id")
 
-            #Found the tournament
+                #Found the tournament
 
-            #Recovering scores from db and blockchain
-            tour_with_scores = self.tournaments_fetcher.populate_scores_from_db([tour])[0]
+                #Recovering scores from db and blockchain
+                tour_with_scores = self.tournaments_fetcher.populate_scores_from_db([tour])[0]
 
             resp.body = json.dumps(tour_with_scores, cls=TournamentJSONEncoder)
             resp.status = falcon.HTTP_200
+            tournament_snapshot.set_staleness_headers(resp, self.snapshot_poller, snapshot)
 
         except Exception as e:
             LOGGER.exception(e)
@@ -0,0 +1,91 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+#Concurrency benchmark of the score database access, comparing a new
+#connection per statement (previous behavior) against the per-thread
+#connections in WAL mode, with several threads reading and writing scores.
+#Run from the project root: python -m creepts.tests.benchmark_db
+
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+
+os.environ.setdefault('ACCOUNT_ADDRESS', "0x760841c050d07d3f74139154284d1cd8b5afa9c6")
+os.environ.setdefault('CONTRACTS_DIR', "/")
+
+from creepts import constants as const
+
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_benchmark.db")
+
+from creepts.db import db_utilities
+
+THREADS = 8
+OPERATIONS = 400
+#One write every WRITE_EVERY operations, the rest are reads
+WRITE_EVERY = 5
+TOURNAMENTS = 50
+
+def execute_per_statement(sql_statement, statement_args=None, commit=False, fetch=False):
+    """The previous db_utilities.execute, opening a connection for each statement"""
+    conn = sqlite3.connect(const.DB_NAME, timeout=const.DB_BUSY_TIMEOUT)
+    conn.set_trace_callback(lambda statement: None)
+    cursor = conn.cursor()
+    ret = None
+    if statement_args:
+        cursor.execute(sql_statement, statement_args)
+    else:
+        cursor.execute(sql_statement)
+    if fetch:
+        ret = cursor.fetchall()
+    cursor.close()
+    if commit:
+        conn.commit()
+    conn.close()
+    return ret
+
+def worker(thread_id):
+    for i in range(OPERATIONS):
+        tournament_id = str((thread_id * OPERATIONS + i) % TOURNAMENTS)
+        if i % WRITE_EVERY == 0:
+            db_utilities.update_log_entry(const.PLAYER_OWN_ADD, tournament_id, i, i, b'{}')
+        else:
+            db_utilities.select_log_entry(const.PLAYER_OWN_ADD, tournament_id)
+
+def run(name):
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = THREADS * OPERATIONS
+    print("{:>22}: {:8.0f} operations/s ({:.2f}s for {})".format(name, total / elapsed, elapsed, total))
+
+def main():
+    for t in range(TOURNAMENTS):
+        db_utilities.insert_log_entry(const.PLAYER_OWN_ADD, str(t), 0, 0, b'{}')
+
+    pooled_execute = db_utilities.execute
+
+    db_utilities.execute = execute_per_statement
+    run("connection per query")
+
+    db_utilities.execute = pooled_execute
+    run("per-thread connection")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+#Micro-benchmark of the per-tournament mapping cost, with the static yaml
+#information parsed on every call (previous behavior) and cached.
+#Run from the project root: python -m creepts.tests.benchmark_mapper
+
+import os
+import json
+import timeit
+
+os.environ.setdefault('ACCOUNT_ADDRESS', "0x760841c050d07d3f74139154284d1cd8b5afa9c6")
+os.environ.setdefault('CONTRACTS_DIR', "/")
+
+from creepts.dispatcher.contract import Contract
+from creepts.mapping import mapper
+
+ROUNDS = 2000
+
+def main():
+    filename = os.path.join(os.path.dirname(__file__), 'instance_samples/instance_step_7.json')
+    with open(filename) as json_file:
+        dapp = Contract(json.load(json_file))
+
+    tournament_mapper = mapper.Mapper(mapper.Web3.toChecksumAddress(os.environ['ACCOUNT_ADDRESS']))
+
+    def uncached():
+        mapper.YAML_CACHE.clear()
+        tournament_mapper.to_tournament(dapp)
+
+    mapper.Mapper.preload()
+    cached = lambda: tournament_mapper.to_tournament(dapp)
+
+    for name, func in (("parse every call", uncached), ("cached", cached)):
+        elapsed = timeit.timeit(func, number=ROUNDS)
+        print("{:>16}: {:8.1f} us per tournament".format(name, elapsed / ROUNDS * 1e6))
+
+if __name__ == '__main__':
+    main()
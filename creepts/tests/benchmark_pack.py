@@ -0,0 +1,69 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+#Throughput benchmark of the game log packing, comparing the packlog script
+#(previous behavior, skipped when brotli or cpio are not installed) against
+#the in-process packer, over the mock logs.
+#Run from the project root: python -m creepts.tests.benchmark_pack
+
+import os
+import glob
+import time
+import shutil
+import tempfile
+import subprocess
+
+os.environ.setdefault('ACCOUNT_ADDRESS', "0x760841c050d07d3f74139154284d1cd8b5afa9c6")
+os.environ.setdefault('CONTRACTS_DIR', "/")
+
+from creepts import constants as const
+from creepts.utils import hash_utils
+
+ROUNDS = 20
+
+def pack_with_script(log_bytes, tmpdir):
+    log_path = os.path.join(tmpdir, "log.json")
+    with open(log_path, 'wb') as log_file:
+        log_file.write(log_bytes)
+    subprocess.run([const.PACKLOG_CMD, log_path, log_path + "." + const.PACKED_LOG_EXT], check=True)
+
+def pack_in_process(log_bytes, tmpdir):
+    hash_utils.pack_log(log_bytes)
+
+def run(name, pack, logs):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for log_bytes in logs:
+                pack(log_bytes, tmpdir)
+        elapsed = time.perf_counter() - start
+
+    total = ROUNDS * len(logs)
+    size = ROUNDS * sum(len(log_bytes) for log_bytes in logs)
+    print("{:>12}: {:8.0f} logs/s {:8.2f} MB/s ({:.2f}s for {})".format(name, total / elapsed, size / elapsed / 1e6, elapsed, total))
+
+def main():
+    logs = []
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'mock_logs', '*.json'))):
+        with open(filename, 'rb') as log_file:
+            logs.append(log_file.read())
+
+    if shutil.which("brotli") and shutil.which("cpio"):
+        run("packlog", pack_with_script, logs)
+    else:
+        print("brotli or cpio not installed, skipping the packlog script")
+
+    run("in-process", pack_in_process, logs)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import falcon
+import json
+import time
+import hashlib
+import itertools
+import threading
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+#Commit jobs of the mocked score submissions, by id, they are done right away
+MOCKED_JOBS = {}
+_JOB_IDS = itertools.count(1)
+_LOCK = threading.Lock()
+
+def add_job(tournament_id, log_bytes):
+    """Records a done commit job of the given log and returns its id"""
+    now = time.time()
+    with _LOCK:
+        job_id = next(_JOB_IDS)
+        MOCKED_JOBS[job_id] = {
+            "id": job_id,
+            "tournament_id": str(tournament_id),
+            "status": "done",
+            "attempts": 1,
+            "hash": "0x" + hashlib.sha256(log_bytes).hexdigest(),
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+    return job_id
+
+class CommitJobs:
+
+    def on_get(self, req, resp, job_id):
+        """
+        Handles the get method for the status of a log commit job
+
+        Parameters
+        ----------
+        req : falcon.Request
+            Contains the request, this method has no input parameters
+
+        resp: falcon.Response
+            This object is used to issue the response to this call,
+            if no error occurs, it returns a structure with the job
+            like the one of the real resource
+            if there is no job with the given id, returns 404
+
+        job_id : str
+            The id of the desired job, as returned by the score submission
+
+        Returns
+        -------
+
+        NoneType
+            This method has no return
+        """
+
+        #WARNING! Mocked response
+        try:
+            job = MOCKED_JOBS.get(int(job_id))
+        except ValueError:
+            job = None
+
+        if not job:
+            raise falcon.HTTPNotFound(description="No commit job found with the provided id: {}".format(job_id))
+
+        resp.body = json.dumps(job)
+        resp.status = falcon.HTTP_200
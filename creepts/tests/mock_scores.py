@@ -21,6 +21,7 @@ import logging
 from .. import constants as const
 from ..utils import game_log_utils, hash_utils
 from ..db import db_utilities
+from . import mock_jobs
 
 LOGGER = logging.getLogger(__name__)
 
@@ -38,8 +39,9 @@ class Scores:
 
         resp: falcon.Response
             This object is used to issue the response to this call,
-            if no error occurs, it returns a 204 if there was a score
-            and it was improved and a 201 if it is the 1st score stored
+            if no error occurs, it returns a 202 with the id of the
+            commit job of the log, also in the Location header, if it
+            is the 1st score stored or it improves the stored one
             if there is already a log with better score, it returns
             a 409 - Conflict, you already have a better score response
             if the tournament is not accepting logs, it returns
@@ -104,15 +106,20 @@ class Scores:
             if (score > previous_score):
                 #It is, store it
                 db_utilities.update_log_entry(user_id, tour_id, score, waves, log_bytes)
-                resp.status = falcon.HTTP_204
+                description = "Score, wave number and log were updated for tournament {}, log commit queued".format(tour_id)
             else:
                 #It isn't return 409
                 raise falcon.HTTPConflict(description="The given score is not higher than a previously submitted one")
         else:
             #No previous entry, store
             db_utilities.insert_log_entry(user_id, tour_id, score, waves, log_bytes)
-            resp.body = json.dumps({"title":"201 Created","description":"Score, wave number and log were created for tournament {}".format(tour_id)})
-            resp.status = falcon.HTTP_201
+            description = "Score, wave number and log were created for tournament {}, log commit queued".format(tour_id)
+
+        #Same answer as the real resource, with a commit job that is already done
+        job_id = mock_jobs.add_job(tour_id, log_bytes)
+        resp.body = json.dumps({"title":"202 Accepted","description":description,"job_id":job_id})
+        resp.location = "/api/jobs/{}".format(job_id)
+        resp.status = falcon.HTTP_202
 
     def on_get_my(self, req, resp, tour_id):
         """
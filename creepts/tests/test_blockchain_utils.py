@@ -0,0 +1,230 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from web3 import Web3
+from eth_abi import encode_abi
+from creepts import constants as const
+from creepts.dispatcher.contract import Contract
+from creepts.utils import blockchain_utils
+from creepts.mapping.blockchain import BlockchainDecorator
+from creepts.model.tournament import Tournament
+
+PLAYER = Web3.toChecksumAddress("0x2218b3b41581e3b3fea3d1cb5e37d9c66fa5d3a0")
+REVEAL_ADDRESS = Web3.toChecksumAddress("0x926fc8818e8666880394665ac5d6d251a7f1a02c")
+
+#Subset of the RevealInstantiator ABI used by the backend
+REVEAL_ABI = [
+    {"name": "getNumberOfPlayers", "type": "function", "stateMutability": "view",
+        "inputs": [{"name": "_index", "type": "uint256"}],
+        "outputs": [{"name": "", "type": "uint256"}]},
+    {"name": "getScore", "type": "function", "stateMutability": "view",
+        "inputs": [{"name": "_index", "type": "uint256"}, {"name": "_playerAddr", "type": "address"}],
+        "outputs": [{"name": "", "type": "uint256"}]},
+    {"name": "getLogHash", "type": "function", "stateMutability": "view",
+        "inputs": [{"name": "_index", "type": "uint256"}, {"name": "_playerAddr", "type": "address"}],
+        "outputs": [{"name": "", "type": "bytes32"}]}
+]
+
+class MockNodeHandler(BaseHTTPRequestHandler):
+    """Answers JSON-RPC batches of eth_call by function selector"""
+
+    batches = []
+
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        MockNodeHandler.batches.append(batch)
+
+        selectors = {
+            Web3.keccak(text="getNumberOfPlayers(uint256)")[:4].hex()[2:]: (['uint256'], [4]),
+            Web3.keccak(text="getScore(uint256,address)")[:4].hex()[2:]: (['uint256'], [1500]),
+            Web3.keccak(text="getLogHash(uint256,address)")[:4].hex()[2:]: (['bytes32'], [b'\x02' * 32])
+        }
+
+        responses = []
+        # answer in reverse order, batches need not keep it
+        for request in reversed(batch):
+            types, values = selectors[request["params"][0]["data"][2:10]]
+            responses.append({"jsonrpc": "2.0", "id": request["id"], "result": "0x" + encode_abi(types, values).hex()})
+
+        body = json.dumps(responses).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockEth:
+
+    def __init__(self):
+        self.blockNumber = 100
+
+class MockWeb3:
+
+    def __init__(self):
+        self.eth = MockEth()
+
+class MockFunctionCall:
+
+    def __init__(self, contract, name, args):
+        self.contract = contract
+        self.name = name
+        self.args = args
+
+    def call(self, block_identifier=None):
+        self.contract.calls.append((self.name, self.args, block_identifier))
+        if self.name == "getNumberOfPlayers":
+            return 4
+        if self.name == "getScore":
+            return block_identifier
+        if self.name == "getLogHash":
+            return b'\x01' * 32
+        return True
+
+class MockFunctions:
+
+    def __init__(self, contract):
+        self.contract = contract
+
+    def __getattr__(self, name):
+        return lambda *args: MockFunctionCall(self.contract, name, args)
+
+class MockRevealInstantiator:
+
+    def __init__(self):
+        self.calls = []
+        self.functions = MockFunctions(self)
+
+class TestBlockchainCache(unittest.TestCase):
+
+    def setUp(self):
+        filename = os.path.join(os.path.dirname(__file__), 'instance_samples/instance_step_7.json')
+        with open(filename) as json_file:
+            self.dapp = Contract(json.load(json_file))
+
+        self.contract = MockRevealInstantiator()
+        self.w3 = MockWeb3()
+
+        self.original_w3 = blockchain_utils.w3
+        self.original_interval = const.BLOCK_CHECK_INTERVAL
+        blockchain_utils.w3 = self.w3
+        blockchain_utils.CONTRACT_CACHE["RevealCommit"] = self.contract
+        blockchain_utils.CALL_CACHE.clear()
+        blockchain_utils._LATEST_BLOCK = (None, 0)
+
+    def tearDown(self):
+        blockchain_utils.w3 = self.original_w3
+        const.BLOCK_CHECK_INTERVAL = self.original_interval
+        del blockchain_utils.CONTRACT_CACHE["RevealCommit"]
+        blockchain_utils.CALL_CACHE.clear()
+
+    def test_reads_cached_within_block(self):
+        before = blockchain_utils.get_cache_stats()
+
+        for _ in range(3):
+            self.assertEqual(blockchain_utils.get_number_of_players(self.dapp), 4)
+            self.assertEqual(blockchain_utils.get_player_score(self.dapp, PLAYER), 100)
+            self.assertEqual(blockchain_utils.get_player_hash(self.dapp, PLAYER), "0x" + "01" * 32)
+
+        # a single eth_call per function, pinned to the block
+        self.assertEqual(self.contract.calls, [
+            ("getNumberOfPlayers", (0,), 100),
+            ("getScore", (0, PLAYER), 100),
+            ("getLogHash", (0, PLAYER), 100)])
+
+        after = blockchain_utils.get_cache_stats()
+        self.assertEqual(after["hits"] - before["hits"], 6)
+        self.assertEqual(after["misses"] - before["misses"], 3)
+        # three reads plus one block number check
+        self.assertEqual(after["rpc_calls"] - before["rpc_calls"], 4)
+
+    def test_new_block_invalidates(self):
+        # check the block number on every read
+        const.BLOCK_CHECK_INTERVAL = 0
+
+        self.assertEqual(blockchain_utils.get_player_score(self.dapp, PLAYER), 100)
+        self.assertEqual(blockchain_utils.get_player_score(self.dapp, PLAYER), 100)
+
+        self.w3.eth.blockNumber = 101
+        self.assertEqual(blockchain_utils.get_player_score(self.dapp, PLAYER), 101)
+
+        self.assertEqual(len(self.contract.calls), 2)
+        self.assertEqual(len(blockchain_utils.CALL_CACHE), 1)
+
+class TestBatchCall(unittest.TestCase):
+
+    def setUp(self):
+        filename = os.path.join(os.path.dirname(__file__), 'instance_samples/instance_step_7.json')
+        with open(filename) as json_file:
+            self.dapp = Contract(json.load(json_file))
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockNodeHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        MockNodeHandler.batches = []
+
+        self.original_w3 = blockchain_utils.w3
+        self.original_uri = const.WEB3_PROVIDER_URI
+        blockchain_utils.w3 = MockWeb3()
+        blockchain_utils.CONTRACT_CACHE["RevealCommit"] = Web3().eth.contract(address=REVEAL_ADDRESS, abi=REVEAL_ABI)
+        blockchain_utils.CALL_CACHE.clear()
+        blockchain_utils._LATEST_BLOCK = (None, 0)
+        const.WEB3_PROVIDER_URI = "http://127.0.0.1:{}".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        blockchain_utils.w3 = self.original_w3
+        const.WEB3_PROVIDER_URI = self.original_uri
+        del blockchain_utils.CONTRACT_CACHE["RevealCommit"]
+        blockchain_utils.CALL_CACHE.clear()
+
+    def test_single_batch(self):
+        calls = [
+            (self.dapp, "getNumberOfPlayers", ()),
+            (self.dapp, "getScore", (PLAYER,)),
+            (self.dapp, "getLogHash", (PLAYER,))]
+
+        self.assertEqual(blockchain_utils.batch_call(calls), [4, 1500, b'\x02' * 32])
+        self.assertEqual(len(MockNodeHandler.batches), 1)
+        self.assertEqual([r["params"][1] for r in MockNodeHandler.batches[0]], ["0x64"] * 3)
+
+        # all cached for the block now
+        self.assertEqual(blockchain_utils.batch_call(calls), [4, 1500, b'\x02' * 32])
+        self.assertEqual(len(MockNodeHandler.batches), 1)
+
+    def test_decorator(self):
+        tournament = Tournament(7, "saturday one", "original")
+        tournament.winner = PLAYER
+
+        BlockchainDecorator().apply(self.dapp, tournament)
+
+        self.assertEqual(tournament.playerCount, 4)
+        self.assertEqual(tournament.scores, {PLAYER: {"score": 1500, "hash": "0x" + "02" * 32}})
+        self.assertEqual(len(MockNodeHandler.batches), 1)
+        self.assertEqual(len(MockNodeHandler.batches[0]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
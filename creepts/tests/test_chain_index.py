@@ -0,0 +1,138 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from web3 import Web3
+from creepts import constants as const
+from creepts.dispatcher.contract import Contract
+from creepts.utils.chain_index import ChainIndex, EMPTY_HASH
+
+PLAYER_A = Web3.toChecksumAddress("0x2218b3b41581e3b3fea3d1cb5e37d9c66fa5d3a0")
+PLAYER_B = Web3.toChecksumAddress("0x3a0afba9a89cf64dd22a570d833f5da04f3020b6")
+
+class MockChain:
+    """Local chain stand-in: mines blocks holding RevealInstantiator events"""
+
+    def __init__(self):
+        self.blockNumber = 0
+        self.logs = []
+        self.queries = []
+
+    def mine(self, *events):
+        self.blockNumber += 1
+        for log_index, (event, args) in enumerate(events):
+            self.logs.append({"event": event, "args": args, "blockNumber": self.blockNumber, "logIndex": log_index})
+
+class MockEvent:
+
+    def __init__(self, chain, name):
+        self.chain = chain
+        self.name = name
+
+    def getLogs(self, fromBlock, toBlock):
+        self.chain.queries.append((self.name, fromBlock, toBlock))
+        return [log for log in self.chain.logs if log["event"] == self.name and fromBlock <= log["blockNumber"] <= toBlock]
+
+class MockRevealInstantiator:
+
+    def __init__(self, chain):
+        self.events = {name: MockEvent(chain, name) for name in ("logCommited", "logRevealed")}
+
+class MockWeb3:
+
+    def __init__(self, chain):
+        self.eth = chain
+
+class TestChainIndex(unittest.TestCase):
+
+    def setUp(self):
+        filename = os.path.join(os.path.dirname(__file__), 'instance_samples/instance_step_7.json')
+        with open(filename) as json_file:
+            self.dapp = Contract(json.load(json_file))
+
+        self.chain = MockChain()
+        self.index = ChainIndex(MockRevealInstantiator(self.chain), MockWeb3(self.chain), from_block=1,
+            commit_event="logCommited", reveal_event="logRevealed", confirmations=0)
+
+    def test_not_synced(self):
+        self.assertFalse(self.index.is_synced())
+
+    def test_incremental_sync(self):
+        self.chain.mine(("logCommited", {"_index": 0, "_player": PLAYER_A, "_logHash": b'\x01' * 32}))
+        self.chain.mine(
+            ("logCommited", {"_index": 0, "_player": PLAYER_B, "_logHash": b'\x02' * 32}),
+            ("logCommited", {"_index": 1, "_player": PLAYER_B, "_logHash": b'\x03' * 32}))
+        self.index.sync()
+
+        self.assertTrue(self.index.is_synced())
+        self.assertEqual(self.index.last_block, 2)
+        self.assertEqual(self.index.read(self.dapp, "getNumberOfPlayers", ()), 2)
+        self.assertEqual(self.index.read(self.dapp, "getLogHash", (PLAYER_A,)), b'\x01' * 32)
+        self.assertEqual(self.index.read(self.dapp, "getScore", (PLAYER_A,)), 0)
+        self.assertTrue(self.index.read(self.dapp, "playerExist", (PLAYER_B,)))
+
+        self.chain.mine(("logRevealed", {"_index": 0, "_player": PLAYER_A, "_score": 1200}))
+        self.chain.queries = []
+        self.index.sync()
+
+        # only the new block was queried
+        self.assertEqual(self.chain.queries, [("logCommited", 3, 3), ("logRevealed", 3, 3)])
+        self.assertEqual(self.index.read(self.dapp, "getScore", (PLAYER_A,)), 1200)
+
+        unknown = Web3.toChecksumAddress("0x760841c050d07d3f74139154284d1cd8b5afa9c6")
+        self.assertEqual(self.index.read(self.dapp, "getLogHash", (unknown,)), EMPTY_HASH)
+        self.assertFalse(self.index.read(self.dapp, "playerExist", (unknown,)))
+
+    def test_chunked_sync(self):
+        original_range = const.CHAIN_INDEX_BLOCK_RANGE
+        const.CHAIN_INDEX_BLOCK_RANGE = 2
+
+        try:
+            for _ in range(5):
+                self.chain.mine()
+            self.index.sync()
+        finally:
+            const.CHAIN_INDEX_BLOCK_RANGE = original_range
+
+        self.assertEqual([q[1:] for q in self.chain.queries if q[0] == "logCommited"], [(1, 2), (3, 4), (5, 5)])
+        self.assertEqual(self.index.last_block, 5)
+
+    def test_confirmations(self):
+        self.index.confirmations = 2
+        self.chain.mine(("logCommited", {"_index": 0, "_player": PLAYER_A, "_logHash": b'\x01' * 32}))
+        self.chain.mine(("logCommited", {"_index": 0, "_player": PLAYER_B, "_logHash": b'\x02' * 32}))
+        self.chain.logs[-1]["removed"] = True
+        self.index.sync()
+
+        # not confirmed yet
+        self.assertEqual(self.index.last_block, 0)
+        self.assertFalse(self.index.read(self.dapp, "playerExist", (PLAYER_A,)))
+
+        self.chain.mine()
+        self.chain.mine()
+        self.index.sync()
+
+        # logs removed by a reorganization are left out
+        self.assertEqual(self.index.last_block, 2)
+        self.assertTrue(self.index.read(self.dapp, "playerExist", (PLAYER_A,)))
+        self.assertFalse(self.index.read(self.dapp, "playerExist", (PLAYER_B,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
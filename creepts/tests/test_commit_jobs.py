@@ -0,0 +1,142 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import tempfile
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+
+#Keep the test database out of the source tree
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_test.db")
+
+from creepts.db import db_utilities, commit_jobs
+from creepts.utils import commit_worker, hash_utils
+
+class MockResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+class MockDispatcherAPI:
+    """Dispatcher stand-in answering the commits with the given status codes in turn"""
+
+    def __init__(self, *status_codes):
+        self.status_codes = list(status_codes)
+        self.posts = []
+
+    def post(self, index, payload):
+        self.posts.append((index, json.loads(payload)))
+        return MockResponse(self.status_codes.pop(0))
+
+class TestCommitJobs(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # the module may have been imported by other tests with another database
+        db_utilities.create_db()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_settings = (const.LOG_FILES_OUTPUT_DIR, const.COMMIT_JOB_RETRY_DELAY)
+        const.LOG_FILES_OUTPUT_DIR = self.tmpdir.name + "/"
+        const.COMMIT_JOB_RETRY_DELAY = 0
+
+        # leave no job from other tests behind
+        db_utilities.execute("DELETE FROM {}".format(const.COMMIT_JOB_TABLE), commit=True)
+
+    def tearDown(self):
+        const.LOG_FILES_OUTPUT_DIR, const.COMMIT_JOB_RETRY_DELAY = self.original_settings
+        self.tmpdir.cleanup()
+
+    def test_commit(self):
+        job_id = commit_jobs.enqueue("7", b'{"actions": []}')
+        self.assertEqual(commit_jobs.get(job_id)["status"], commit_jobs.PENDING)
+
+        dispatcher = MockDispatcherAPI(200)
+        workers = commit_worker.CommitWorkers(dispatcher)
+        self.assertTrue(workers.run_once())
+        self.assertFalse(workers.run_once())
+
+        expected_hash = hash_utils.log_drive_hash(hash_utils.pack_log(b'{"actions": []}'))
+        self.assertEqual(dispatcher.posts, [(7, {"action": "commit", "params": {"hash": expected_hash}})])
+
+        job = commit_jobs.get(job_id)
+        self.assertEqual((job["status"], job["attempts"], job["hash"]), (commit_jobs.DONE, 1, expected_hash))
+
+    def test_retries(self):
+        original_attempts = const.COMMIT_JOB_MAX_ATTEMPTS
+        const.COMMIT_JOB_MAX_ATTEMPTS = 2
+
+        try:
+            ok_job_id = commit_jobs.enqueue("1", b'{}')
+            failed_job_id = commit_jobs.enqueue("2", b'{}')
+
+            workers = commit_worker.CommitWorkers(MockDispatcherAPI(500, 200, 500, 500))
+            while workers.run_once():
+                pass
+        finally:
+            const.COMMIT_JOB_MAX_ATTEMPTS = original_attempts
+
+        ok_job = commit_jobs.get(ok_job_id)
+        self.assertEqual((ok_job["status"], ok_job["attempts"]), (commit_jobs.DONE, 2))
+
+        failed_job = commit_jobs.get(failed_job_id)
+        self.assertEqual((failed_job["status"], failed_job["attempts"]), (commit_jobs.FAILED, 2))
+        self.assertIn("Failed to commit", failed_job["error"])
+
+    def test_superseded(self):
+        old_job_id = commit_jobs.enqueue("3", b'{"score": 1}')
+        new_job_id = commit_jobs.enqueue("3", b'{"score": 2}')
+
+        self.assertEqual(commit_jobs.get(old_job_id)["status"], commit_jobs.SUPERSEDED)
+        self.assertEqual(commit_jobs.claim()["id"], new_job_id)
+
+    def test_crash_recovery(self):
+        job_id = commit_jobs.enqueue("4", b'{}')
+        self.assertEqual(commit_jobs.claim()["id"], job_id)
+
+        # the job is owned by its worker while the lease lasts
+        self.assertIsNone(commit_jobs.claim())
+
+        # the worker died, once the lease expires the job runs again
+        db_utilities.execute("UPDATE {} SET lease_until=0 WHERE id=?".format(const.COMMIT_JOB_TABLE), (job_id,), commit=True)
+        job = commit_jobs.claim()
+        self.assertEqual((job["id"], job["attempts"]), (job_id, 2))
+
+    def test_crash_recovery_gives_up(self):
+        original_attempts = const.COMMIT_JOB_MAX_ATTEMPTS
+        const.COMMIT_JOB_MAX_ATTEMPTS = 2
+        self.addCleanup(setattr, const, "COMMIT_JOB_MAX_ATTEMPTS", original_attempts)
+
+        job_id = commit_jobs.enqueue("5", b'{}')
+        expire_lease = "UPDATE {} SET lease_until=0 WHERE id=?".format(const.COMMIT_JOB_TABLE)
+
+        # the worker dies on every attempt
+        for attempt in (1, 2):
+            self.assertEqual(commit_jobs.claim()["attempts"], attempt)
+            db_utilities.execute(expire_lease, (job_id,), commit=True)
+
+        # out of attempts, it is failed instead of run again
+        self.assertIsNone(commit_jobs.claim())
+        job = commit_jobs.get(job_id)
+        self.assertEqual((job["status"], job["attempts"], job["error"]), (commit_jobs.FAILED, 2, "Lease expired"))
+
+
+if __name__ == '__main__':
+    unittest.main()
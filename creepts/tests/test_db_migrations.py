@@ -0,0 +1,103 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+
+#Keep the test database out of the source tree
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_test.db")
+
+from creepts.db import migrations, log_store
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmpdir.name, "creepts.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _query(self, sql, args=()):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def test_new_database(self):
+        self.assertEqual(migrations.migrate(self.db_name), migrations.MIGRATIONS[-1][0])
+
+        # running again is a no-op
+        self.assertEqual(migrations.migrate(self.db_name), migrations.MIGRATIONS[-1][0])
+
+    def test_upgrade_unversioned_database(self):
+        # database created before migrations, with a duplicated entry
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("CREATE TABLE user_logs (user_id TEXT NOT NULL, tournament_id TEXT NOT NULL, score INTEGER NOT NULL, waves INTEGER NOT NULL, log BLOB NOT NULL);")
+        conn.executemany("INSERT INTO user_logs VALUES (?, ?, ?, ?, ?)", [
+            ("0xA", "1", 10, 1, b'{"a": 1}'),
+            ("0xA", "1", 30, 3, b'{"a": 3}'),
+            ("0xA", "1", 20, 2, b'{"a": 2}'),
+            ("0xA", "2", 5, 1, b'{"b": 1}')])
+        conn.commit()
+        conn.close()
+
+        migrations.migrate(self.db_name)
+
+        # best score kept
+        rows = self._query("SELECT user_id, tournament_id, score, waves FROM user_logs ORDER BY tournament_id")
+        self.assertEqual(rows, [("0xA", "1", 30, 3), ("0xA", "2", 5, 1)])
+
+        # logs moved to the store next to the database
+        log_hashes = self._query("SELECT log_hash FROM user_logs ORDER BY tournament_id")
+        store_dir = os.path.join(self.tmpdir.name, "logs")
+        self.assertEqual(log_store.get(log_hashes[0][0], store_dir), b'{"a": 3}')
+        self.assertEqual(log_store.get(log_hashes[1][0], store_dir), b'{"b": 1}')
+
+        # a user has a single entry per tournament
+        conn = sqlite3.connect(self.db_name)
+        self.assertRaises(sqlite3.IntegrityError, conn.execute, "INSERT INTO user_logs VALUES ('0xA', '2', 1, 1, 'hash')")
+        conn.close()
+
+    def test_queries_use_indexes(self):
+        migrations.migrate(self.db_name)
+
+        plan = self._query("EXPLAIN QUERY PLAN " + const.BASE_SELECT_LOG_TABLE_FROM_TOURNAMENTS + "(?, ?)", ("1", "2"))
+        self.assertIn("COVERING INDEX", " ".join(row[-1] for row in plan))
+
+        plan = self._query("EXPLAIN QUERY PLAN " + const.SELECT_LOG_TABLE_FROM_USER_AND_TOURNAMENT, ("0xA", "1"))
+        self.assertIn("INDEX", " ".join(row[-1] for row in plan))
+
+class TestLogStore(unittest.TestCase):
+
+    def test_put_get(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            log_hash = log_store.put(b'{"actions": []}', store_dir)
+            self.assertEqual(log_hash, "d9d15243a8a6b5738649a79f792db941d293bb41146a82425e7281e457493a0a")
+            self.assertEqual(log_store.get(log_hash, store_dir), b'{"actions": []}')
+
+            # same content is stored once
+            self.assertEqual(log_store.put(b'{"actions": []}', store_dir), log_hash)
+            self.assertEqual(sum(len(files) for _, _, files in os.walk(store_dir)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+
+#Keep the test database out of the source tree
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_test.db")
+
+from creepts.db import db_utilities, log_store
+
+class TestStoreBestLogEntry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # the module may have been imported by other tests with another database
+        db_utilities.create_db()
+
+    def test_store_best(self):
+        tournament_id = "store_best"
+
+        self.assertEqual(db_utilities.store_best_log_entry("0xA", tournament_id, 10, 1, b'{"a": 1}'), db_utilities.LOG_ENTRY_CREATED)
+        self.assertEqual(db_utilities.store_best_log_entry("0xA", tournament_id, 20, 2, b'{"a": 2}'), db_utilities.LOG_ENTRY_UPDATED)
+
+        # lower or equal scores leave the entry untouched
+        self.assertIsNone(db_utilities.store_best_log_entry("0xA", tournament_id, 20, 5, b'{"a": 3}'))
+        self.assertIsNone(db_utilities.store_best_log_entry("0xA", tournament_id, 5, 5, b'{"a": 4}'))
+
+        self.assertEqual(db_utilities.select_log_entry("0xA", tournament_id), ("0xA", tournament_id, 20, 2, b'{"a": 2}'))
+
+        # the rejected logs were not stored
+        for log in (b'{"a": 3}', b'{"a": 4}'):
+            with self.assertRaises(FileNotFoundError):
+                log_store.get(log_store.get_hash(log))
+
+    def test_concurrent_submissions(self):
+        tournament_id = "concurrent"
+        results = []
+
+        def submit(score):
+            results.append(db_utilities.store_best_log_entry("0xA", tournament_id, score, score, str(score).encode()))
+
+        threads = [threading.Thread(target=submit, args=(score,)) for score in range(1, 21)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a single creation and the best score wins, whatever the order
+        self.assertEqual(results.count(db_utilities.LOG_ENTRY_CREATED), 1)
+        self.assertEqual(db_utilities.select_log_entry("0xA", tournament_id)[2:], (20, 20, b'20'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import unittest
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts.dispatcher import api
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), 'instance.json')
+
+class MockDispatcherHandler(BaseHTTPRequestHandler):
+    # keep-alive connections need HTTP/1.1
+    protocol_version = "HTTP/1.1"
+    # set to hold the responses until then
+    gate = None
+
+    def do_GET(self):
+        if self.gate:
+            self.gate.wait()
+
+        length = int(self.headers.get('Content-Length', 0))
+        req_json = json.loads(self.rfile.read(length)) if length else None
+
+        if req_json and "Instance" in req_json:
+            with open(TESTDATA_FILENAME, 'rb') as json_file:
+                body = json_file.read()
+        else:
+            body = json.dumps([0, 1, 2]).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestDispatcherAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockDispatcherHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_is_shared(self):
+        self.assertIs(api.API(self.url).session, api.API(self.url).session)
+
+    def test_connection_reuse(self):
+        dispatcher_api = api.API(self.url)
+        before = api.get_pool_stats()
+
+        self.assertEqual(dispatcher_api.get_instance_indexes(), [0, 1, 2])
+        for index in range(3):
+            dapp = dispatcher_api.get_instance(index)
+            self.assertEqual(dapp.name, "DAppMock")
+
+        after = api.get_pool_stats()
+
+        # 4 requests over a single keep-alive connection
+        self.assertEqual(after["requests"] - before["requests"], 4)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 3)
+
+    def test_concurrent_reads_coalesced(self):
+        dispatcher_api = api.API(self.url)
+        MockDispatcherHandler.gate = threading.Event()
+        self.addCleanup(setattr, MockDispatcherHandler, "gate", None)
+
+        before_pool = api.get_pool_stats()
+        before = api._FLIGHTS.get_stats()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(dispatcher_api.get_instance(1))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+
+        # answer once every thread is waiting on the first request
+        deadline = time.monotonic() + 5
+        while api._FLIGHTS.get_stats()["coalesced"] - before["coalesced"] < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        MockDispatcherHandler.gate.set()
+        for thread in threads:
+            thread.join()
+
+        after = api._FLIGHTS.get_stats()
+        self.assertEqual(after["coalesced"] - before["coalesced"], 7)
+        self.assertEqual(api.get_pool_stats()["requests"] - before_pool["requests"], 1)
+        self.assertTrue(all(dapp is results[0] for dapp in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,15 +12,18 @@ specific language governing permissions and limitations under the License.
 """
 
 import unittest
+import json
 import os
 import shutil
 import filecmp
+import subprocess
+import tempfile
 
 os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
 os.environ['CONTRACTS_DIR'] = "/"
 
 from creepts.utils import hash_utils
-from creepts.constants import PACKED_LOG_EXT
+from creepts.constants import PACKED_LOG_EXT, PACKLOG_CMD, HASH_BINARY_CMD
 
 class TestDispatcherContract(unittest.TestCase):
 
@@ -70,6 +73,135 @@ class TestDispatcherContract(unittest.TestCase):
         # make sure original file exists
         self.assertTrue(os.path.exists(filepath))
 
+    def test_pack_log_golden(self):
+        log_path = os.path.join(os.path.dirname(__file__), 'mock_logs', 'pack.json')
+        golden_path = os.path.join(os.path.dirname(__file__), 'mock_logs', 'pack.json.golden.br.cpio')
+
+        with open(log_path, 'rb') as log_file, open(golden_path, 'rb') as golden_file:
+            log_bytes = log_file.read()
+            packed = hash_utils.pack_log(log_bytes)
+            golden = golden_file.read()
+
+        # the compressed bytes depend on the brotli encoder version, the archive layout doesn't
+        def header(archive):
+            fields = [int(archive[6 + 8 * i:14 + 8 * i], 16) for i in range(13)]
+            name = archive[110:110 + fields[11]]
+            # every field but the file size
+            return archive[:6], fields[:6] + fields[7:], name
+
+        self.assertEqual(header(packed), header(golden))
+        self.assertEqual(hash_utils.unpack_log(packed), log_bytes)
+        self.assertEqual(hash_utils.unpack_log(golden), log_bytes)
+        self.assertEqual(len(packed) % hash_utils.CPIO_BLOCK_SIZE, 0)
+        self.assertIn(b"TRAILER!!!\0", packed)
+
+    def test_unpack_log_drive(self):
+        log_path = os.path.join(os.path.dirname(__file__), 'mock_logs', 'pack.json')
+
+        with open(log_path, 'rb') as log_file:
+            log_bytes = log_file.read()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # a packed log truncated to the 1 MiB drive size, as downloaded by the logger
+            drive_path = os.path.join(tmpdir, 'drive.json.' + PACKED_LOG_EXT)
+            with open(drive_path, 'wb') as drive_file:
+                drive_file.write(hash_utils.pack_log(log_bytes))
+            os.truncate(drive_path, 1 << 20)
+
+            self.assertEqual(hash_utils.load_log_file(os.path.join(tmpdir, 'drive.json')), json.loads(log_bytes))
+
+    def test_unpack_log_invalid(self):
+        # an empty drive
+        self.assertRaises(ValueError, hash_utils.unpack_log, b'\0' * 1024)
+
+        # an archive cut in the middle of the log
+        self.assertRaises(ValueError, hash_utils.unpack_log, hash_utils.pack_log(b'{"a": 1}')[:120])
+
+    @unittest.skipUnless(shutil.which("brotli") and shutil.which("cpio"), "brotli and cpio command line tools are needed")
+    def test_pack_log_matches_script(self):
+        log_path = os.path.join(os.path.dirname(__file__), 'mock_logs', 'pack.json')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script_path = os.path.join(tmpdir, 'pack.json.br.cpio')
+            subprocess.run([PACKLOG_CMD, log_path, script_path], check=True, env=dict(os.environ, TZ="UTC"))
+            with open(script_path, 'rb') as script_file:
+                expected = script_file.read()
+
+        with open(log_path, 'rb') as log_file:
+            packed = hash_utils.pack_log(log_file.read())
+
+        # cpio stores the inode, mode, owner and device of the temporary file, only those may differ
+        def fields(archive):
+            return [archive[6 + 8 * i:14 + 8 * i] for i in range(13)]
+
+        self.assertEqual(len(packed), len(expected))
+        for i in (4, 5, 6, 9, 10, 11, 12):
+            self.assertEqual(fields(packed)[i], fields(expected)[i])
+        self.assertEqual(packed[110:], expected[110:])
+
+def naive_merkle_root(data, tree_log2_size):
+    """Reference merkle root, hashing every word of the zero filled drive"""
+    data = data.ljust(1 << tree_log2_size, b'\0')
+    level = [hash_utils._keccak(data[i:i + 8]) for i in range(0, len(data), 8)]
+    while len(level) > 1:
+        level = [hash_utils._keccak(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+class TestMerkleRootHash(unittest.TestCase):
+
+    def setUp(self):
+        self.logs_dir = os.path.join(os.path.dirname(__file__), 'mock_logs')
+
+    def test_matches_naive_tree(self):
+        data = os.urandom(1500) + b'\0' * 2048 + os.urandom(100)
+        for page_log2_size in (3, 6, 10, 12):
+            self.assertEqual(hash_utils.merkle_root(data, page_log2_size, 13), naive_merkle_root(data, 13))
+
+    def test_zero_tail(self):
+        with open(os.path.join(self.logs_dir, 'pack.json'), 'rb') as log_file:
+            packed = hash_utils.pack_log(log_file.read())
+
+        # a truncated drive hashes the same as its payload
+        self.assertEqual(hash_utils.merkle_root(packed), hash_utils.merkle_root(packed.ljust(1 << 20, b'\0')))
+        self.assertEqual(hash_utils.merkle_root(b''), hash_utils.ZERO_HASHES[20])
+
+    def test_sparse_drive(self):
+        with open(os.path.join(self.logs_dir, 'pack.json'), 'rb') as log_file:
+            packed = hash_utils.pack_log(log_file.read())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            drive_path = os.path.join(tmpdir, 'pack.json.' + PACKED_LOG_EXT)
+            self.assertTrue(hash_utils.write_log_drive(drive_path, packed))
+
+            self.assertEqual(os.path.getsize(drive_path), 1 << 20)
+            self.assertEqual(hash_utils.log_drive_hash(packed), hash_utils.merkle_root_hash(drive_path))
+
+            self.assertTrue(hash_utils.truncate_file(drive_path, "2K"))
+            self.assertEqual(os.path.getsize(drive_path), 2048)
+
+    def test_too_big(self):
+        self.assertRaises(ValueError, hash_utils.merkle_root, b'\1' * 2048, 10, 10)
+
+    @unittest.skipUnless(shutil.which(HASH_BINARY_CMD), "{} is needed".format(HASH_BINARY_CMD))
+    def test_matches_binary(self):
+        for name in sorted(os.listdir(self.logs_dir)):
+            if not name.endswith('.json'):
+                continue
+
+            with open(os.path.join(self.logs_dir, name), 'rb') as log_file:
+                packed = hash_utils.pack_log(log_file.read())
+
+            with tempfile.TemporaryDirectory() as tmpdir:
+                drive_path = os.path.join(tmpdir, name + '.' + PACKED_LOG_EXT)
+                with open(drive_path, 'wb') as drive_file:
+                    drive_file.write(packed)
+                os.truncate(drive_path, 1 << 20)
+
+                result = subprocess.run([HASH_BINARY_CMD, "--input={}".format(drive_path), "--page-log2-size=10", "--tree-log2-size=20"],
+                    stdout=subprocess.PIPE, check=True)
+
+                self.assertEqual(hash_utils.merkle_root_hash(drive_path), "0x{}".format(result.stdout.decode().strip()), name)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts.utils.log_cache import LogCache
+
+class TestLogCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_memory_lru(self):
+        cache = LogCache(max_entries=2, disk_dir="")
+        cache.put("0x1", '{"a": 1}')
+        cache.put("0x2", '{"a": 2}')
+
+        # using 0x1 makes 0x2 the least recently used
+        self.assertEqual(cache.get("0x1"), '{"a": 1}')
+        cache.put("0x3", '{"a": 3}')
+
+        self.assertIsNone(cache.get("0x2"))
+        self.assertEqual(cache.get("0x1"), '{"a": 1}')
+        self.assertEqual(cache.get("0x3"), '{"a": 3}')
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_disk_spillover(self):
+        cache = LogCache(max_entries=1, disk_dir=self.tmpdir.name, max_disk_entries=2)
+        for i in range(4):
+            cache.put("0x{}".format(i), '{{"a": {}}}'.format(i))
+
+        # 0x3 in memory, 0x1 and 0x2 on disk, 0x0 trimmed from it
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["0x1.json", "0x2.json"])
+        self.assertIsNone(cache.get("0x0"))
+
+        self.assertEqual(cache.get("0x2"), '{"a": 2}')
+        self.assertEqual(cache.disk_hits, 1)
+
+        # 0x2 back in memory spilled 0x3 over, trimming the least recently used 0x1
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["0x2.json", "0x3.json"])
+
+        # another process finds the spilled logs
+        self.assertEqual(LogCache(max_entries=1, disk_dir=self.tmpdir.name).get("0x3"), '{"a": 3}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import tempfile
+import threading
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+from creepts.utils import hash_utils
+from creepts.utils.log_cache import LogCache
+from creepts.utils.log_downloads import LogDownloads
+
+class MockLogger:
+    """Logger stand-in, each download call advances the progress by the given step"""
+
+    def __init__(self, tmpdir, step=50):
+        self.tmpdir = tmpdir
+        self.step = step
+        self.calls = 0
+        self.failing = False
+        self.lock = threading.Lock()
+
+    def download(self, commit_hash):
+        with self.lock:
+            self.calls += 1
+            progress = min(self.calls * self.step, 100)
+        if self.failing:
+            raise RuntimeError("logger unavailable")
+        if progress < 100:
+            return {'status': 1, 'progress': progress}
+
+        path = os.path.join(self.tmpdir, '{}.json'.format(commit_hash))
+        with open('{}.{}'.format(path, const.PACKED_LOG_EXT), 'wb') as packed_file:
+            packed_file.write(hash_utils.pack_log(json.dumps({"hash": commit_hash}).encode()))
+        return {'status': 0, 'path': path}
+
+class TestLogDownloads(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = LogCache(max_entries=10, disk_dir="")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_no_wait(self):
+        logger = MockLogger(self.tmpdir.name)
+        downloads = LogDownloads(self.cache, logger.download, poll_interval=0.01)
+
+        # answers with the first progress reported by the logger
+        self.assertEqual(downloads.wait("0x01"), (None, 50))
+
+    def test_shared_download(self):
+        logger = MockLogger(self.tmpdir.name, step=10)
+        downloads = LogDownloads(self.cache, logger.download, poll_interval=0.05)
+
+        results = []
+        def wait():
+            results.append(downloads.wait("0x01", timeout=5))
+
+        threads = [threading.Thread(target=wait) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # every client got the log out of the same ten logger calls
+        self.assertEqual(logger.calls, 10)
+        self.assertTrue(all(log_json is not None and progress == 100 for log_json, progress in results))
+        self.assertEqual(json.loads(self.cache.get("0x01")), {"hash": "0x01"})
+
+        # later requests are served by the cache
+        downloads.wait("0x01")
+        self.assertEqual(logger.calls, 10)
+
+    def test_progress_updates(self):
+        logger = MockLogger(self.tmpdir.name, step=25)
+        downloads = LogDownloads(self.cache, logger.download, poll_interval=0.05)
+
+        updates = []
+        log_json, progress = None, -1
+        while log_json is None:
+            log_json, progress = downloads.wait("0x01", timeout=5, progress=progress)
+            updates.append(progress)
+
+        self.assertEqual(updates, [25, 50, 75, 100])
+
+    def test_failure(self):
+        logger = MockLogger(self.tmpdir.name)
+        logger.failing = True
+        downloads = LogDownloads(self.cache, logger.download, poll_interval=0.01)
+
+        with self.assertRaises(RuntimeError):
+            downloads.wait("0x01", timeout=5)
+
+        # a new request tries again
+        logger.failing = False
+        self.assertEqual(downloads.wait("0x01")[1], 100)
+
+    def test_waiting_slots(self):
+        logger = MockLogger(self.tmpdir.name)
+        downloads = LogDownloads(self.cache, logger.download, poll_interval=0.01, max_waiters=2)
+
+        self.assertTrue(downloads.hold())
+        self.assertTrue(downloads.hold())
+        # every slot is taken until one is given back
+        self.assertFalse(downloads.hold())
+        downloads.release()
+        self.assertTrue(downloads.hold())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+from creepts.model.tournament import Tournament, TournamentPhase
+from creepts.utils import hash_utils
+from creepts.utils.log_cache import LogCache
+from creepts.utils.log_prefetcher import LogPrefetcher, EMPTY_LOG_HASH
+from creepts.utils.tournament_snapshot import TournamentSnapshot
+
+OPPONENT = "0x2218B3b41581E3B3fea3d1CB5e37d9C66fa5d3A0"
+WINNER = "0x3A0aFBa9a89cF64dD22a570d833f5Da04F3020B6"
+
+class MockLogger:
+    """Logger stand-in, the logs it serves are ready unless a gate is given"""
+
+    def __init__(self, tmpdir, gate=None):
+        self.tmpdir = tmpdir
+        self.gate = gate
+        self.downloads = []
+        self.failing = set()
+
+    def download(self, commit_hash):
+        self.downloads.append(commit_hash)
+        if self.gate:
+            self.gate.wait()
+        if commit_hash in self.failing:
+            raise RuntimeError("logger unavailable")
+
+        path = os.path.join(self.tmpdir, '{}.json'.format(commit_hash))
+        with open('{}.{}'.format(path, const.PACKED_LOG_EXT), 'wb') as packed_file:
+            packed_file.write(hash_utils.pack_log(json.dumps({"hash": commit_hash}).encode()))
+        return {'status': 0, 'path': path}
+
+def tournament(tour_id, phase, scores):
+    tour = Tournament(tour_id, "Tournament {}".format(tour_id), "map")
+    tour.phase = phase
+    tour.currentOpponent = OPPONENT if OPPONENT in scores else None
+    tour.winner = WINNER if WINNER in scores else None
+    tour.scores = {player: {"score": 0, "hash": commit_hash} for player, commit_hash in scores.items()}
+    return tour
+
+class TestLogPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = LogCache(max_entries=10, disk_dir="")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _wait_idle(self, prefetcher):
+        prefetcher._executor.submit(lambda: None).result(timeout=5)
+        deadline = time.monotonic() + 5
+        while prefetcher._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_prefetch_snapshot(self):
+        logger = MockLogger(self.tmpdir.name)
+        prefetcher = LogPrefetcher(self.cache, logger.download, max_in_flight=1)
+
+        snapshot = TournamentSnapshot([
+            tournament(1, TournamentPhase.ROUND, {OPPONENT: "0x01"}),
+            tournament(2, TournamentPhase.END, {WINNER: "0x02"}),
+            # nothing to fetch in these
+            tournament(3, TournamentPhase.COMMIT, {OPPONENT: "0x03"}),
+            tournament(4, TournamentPhase.ROUND, {OPPONENT: EMPTY_LOG_HASH})], time.time())
+
+        # one at a time, later snapshots pick up what was left
+        for _ in range(3):
+            prefetcher.on_snapshot(snapshot)
+            self._wait_idle(prefetcher)
+
+        self.assertEqual(sorted(logger.downloads), ["0x01", "0x02"])
+        self.assertEqual(json.loads(self.cache.get("0x02")), {"hash": "0x02"})
+
+    def test_concurrency_cap(self):
+        gate = threading.Event()
+        logger = MockLogger(self.tmpdir.name, gate)
+        prefetcher = LogPrefetcher(self.cache, logger.download, max_in_flight=2)
+
+        started = [prefetcher.prefetch(commit_hash) for commit_hash in ("0x01", "0x01", "0x02", "0x03")]
+        self.assertEqual(started, [True, False, True, False])
+
+        gate.set()
+        self._wait_idle(prefetcher)
+        self.assertTrue(self.cache.contains("0x01") and self.cache.contains("0x02"))
+
+    def test_failure_retry_interval(self):
+        logger = MockLogger(self.tmpdir.name)
+        logger.failing.add("0x01")
+        prefetcher = LogPrefetcher(self.cache, logger.download, retry_interval=60)
+
+        self.assertTrue(prefetcher.prefetch("0x01"))
+        self._wait_idle(prefetcher)
+
+        # failed too recently
+        self.assertFalse(prefetcher.prefetch("0x01"))
+        self.assertEqual(logger.downloads, ["0x01"])
+
+
+if __name__ == '__main__':
+    unittest.main()
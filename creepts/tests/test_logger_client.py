@@ -0,0 +1,153 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sys
+import types
+import pickle
+import unittest
+import threading
+from unittest import mock
+from concurrent import futures
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+import grpc
+from creepts import constants as const
+
+COMMIT_HASH = "0x" + "ab" * 32
+
+#The logger gRPC modules are generated from the grpc-interfaces protos when building the image,
+#the client is tested against stand-ins of them sent through a real channel either way
+SERVICE_NAME = "LoggerManagerHigh"
+
+class Message:
+    """Stand-in of the protobuf messages"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+class LoggerManagerHighStub:
+
+    def __init__(self, channel):
+        self.DownloadFile = channel.unary_unary("/{}/DownloadFile".format(SERVICE_NAME),
+            request_serializer=pickle.dumps, response_deserializer=pickle.loads)
+
+def _stub_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+STUB_MODULES = {
+    "cartesi_base_pb2": _stub_module("cartesi_base_pb2", Hash=Message),
+    "logger_high_pb2": _stub_module("logger_high_pb2", DownloadFileRequest=Message),
+    "logger_high_pb2_grpc": _stub_module("logger_high_pb2_grpc", LoggerManagerHighStub=LoggerManagerHighStub)
+}
+
+try:
+    from creepts.logger import logger_client
+except ImportError:
+    # only for the import, the rest of the suite keeps seeing the modules as missing
+    for name, module in STUB_MODULES.items():
+        sys.modules["creepts.logger." + name] = module
+    try:
+        from creepts.logger import logger_client
+    finally:
+        for name in STUB_MODULES:
+            del sys.modules["creepts.logger." + name]
+
+class TestLoggerClient(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.peers = set()
+
+        for name, module in STUB_MODULES.items():
+            patcher = mock.patch.object(logger_client, name, module)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        def download_file(request, context):
+            """In-process stand-in of the logger, done with every download"""
+            self.requests.append(request.path)
+            self.peers.add(context.peer())
+            return Message(progress=100, status=0)
+
+        handler = grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "DownloadFile": grpc.unary_unary_rpc_method_handler(download_file,
+                request_deserializer=pickle.loads, response_serializer=pickle.dumps)})
+
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        self.server.add_generic_rpc_handlers((handler,))
+        port = self.server.add_insecure_port("127.0.0.1:0")
+        self.server.start()
+
+        self.original_url = const.LOGGER_URL
+        const.LOGGER_URL = "127.0.0.1:{}".format(port)
+        logger_client.close_channel()
+
+    def tearDown(self):
+        logger_client.close_channel()
+        const.LOGGER_URL = self.original_url
+        self.server.stop(None)
+
+    def test_shared_channel(self):
+        stub = logger_client.get_stub()
+
+        results = []
+        def download(commit_hash):
+            results.append(logger_client.LoggerClient().download(commit_hash))
+
+        # distinct logs, downloads of the same one are coalesced
+        threads = [threading.Thread(target=download, args=("0x" + "{:02x}".format(i) * 32,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.requests), 8)
+        self.assertTrue(all(result['status'] == 0 for result in results))
+
+        # every call went through the same stub and connection
+        self.assertIs(logger_client.get_stub(), stub)
+        self.assertEqual(len(self.peers), 1)
+
+    def test_recreated_after_fork(self):
+        stub = logger_client.get_stub()
+
+        # as seen by a forked child
+        logger_client._PID = -1
+        self.assertIsNot(logger_client.get_stub(), stub)
+
+        self.assertEqual(logger_client.LoggerClient().download(COMMIT_HASH)['status'], 0)
+
+    def test_deadline(self):
+        original_timeout = const.LOGGER_REQUEST_TIMEOUT
+        const.LOGGER_REQUEST_TIMEOUT = 0.5
+
+        # nothing listens there
+        const.LOGGER_URL = "127.0.0.1:1"
+        logger_client.close_channel()
+
+        try:
+            with self.assertRaises(grpc.RpcError) as raised:
+                logger_client.LoggerClient().download(COMMIT_HASH)
+        finally:
+            const.LOGGER_REQUEST_TIMEOUT = original_timeout
+
+        self.assertIn(raised.exception.code(), (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED))
+
+
+if __name__ == '__main__':
+    unittest.main()
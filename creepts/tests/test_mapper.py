@@ -20,8 +20,9 @@ os.environ['CONTRACTS_DIR'] = "/"
 
 import unittest
 import json
+import tempfile
 from creepts.dispatcher.contract import Contract
-from creepts.mapping.mapper import Mapper
+from creepts.mapping.mapper import Mapper, load_yaml
 from creepts.model.tournament import TournamentPhase
 
 class TestMapper(unittest.TestCase):
@@ -81,5 +82,22 @@ class TestMapper(unittest.TestCase):
         self.assertEqual(tournament.currentOpponent, None)
         self.assertEqual(tournament.winner, '0x3a0aFbA9a89cF64DD22a570d833F5da04F3020b6')
 
+    def test_yaml_reloaded_on_change(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'info.yaml')
+            with open(filename, 'w') as info_file:
+                info_file.write("0:\n    name: first\n")
+
+            data = load_yaml(filename)
+            self.assertEqual(data[0]["name"], "first")
+            # unchanged file is not parsed again
+            self.assertIs(load_yaml(filename), data)
+
+            with open(filename, 'w') as info_file:
+                info_file.write("0:\n    name: second\n")
+            os.utime(filename, ns=(0, os.stat(filename).st_mtime_ns + 1000000000))
+
+            self.assertEqual(load_yaml(filename)[0]["name"], "second")
+
 if __name__ == '__main__':
     unittest.main()
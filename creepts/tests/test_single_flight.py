@@ -0,0 +1,95 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import time
+import threading
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+from creepts.utils import single_flight
+from creepts.utils.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight("test")
+        self.gate = threading.Event()
+        self.executions = 0
+
+    def _upstream(self, value):
+        self.executions += 1
+        self.gate.wait()
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def _run_concurrently(self, keys, values):
+        results = [None] * len(keys)
+        def call(i):
+            try:
+                results[i] = self.flights.do(keys[i], self._upstream, values[i])
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(keys))]
+        for thread in threads:
+            thread.start()
+
+        # let the upstream calls return once every caller is in
+        deadline = time.monotonic() + 5
+        while not self.gate.is_set() and self.flights.get_stats()["calls"] < len(keys) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.gate.set()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_coalesced(self):
+        results = self._run_concurrently(["a"] * 5 + ["b"] * 3, [1] * 5 + [2] * 3)
+
+        self.assertEqual(results, [1] * 5 + [2] * 3)
+        self.assertEqual(self.executions, 2)
+        self.assertEqual(self.flights.get_stats(), {"calls": 8, "executions": 2, "coalesced": 6, "in_flight": 0})
+        self.assertEqual(single_flight.get_stats()["test"]["coalesced"], 6)
+
+    def test_error_shared(self):
+        error = RuntimeError("upstream down")
+        results = self._run_concurrently(["a"] * 3, [error] * 3)
+
+        self.assertTrue(all(result is error for result in results))
+        self.assertEqual(self.executions, 1)
+
+        # nothing is remembered once the call is over
+        self.gate.set()
+        self.assertEqual(self.flights.do("a", self._upstream, 3), 3)
+
+    def test_disabled(self):
+        # nothing is counted, don't hold the calls
+        self.gate.set()
+        const.SINGLE_FLIGHT_ENABLED = False
+        try:
+            results = self._run_concurrently(["a"] * 3, [1] * 3)
+        finally:
+            const.SINGLE_FLIGHT_ENABLED = True
+
+        self.assertEqual(results, [1] * 3)
+        self.assertEqual(self.executions, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+
+#Keep the test database out of the source tree
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_test.db")
+
+from creepts.model.tournament import Tournament
+from creepts.utils import tournament_recovery_utils as tru
+
+class MockDispatcherAPI:
+
+    def __init__(self, indexes):
+        self.url = "http://dispatcher-{}".format(id(self))
+        self.indexes = indexes
+        self.requested = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get_instance_indexes(self):
+        return self.indexes
+
+    def get_instance(self, index):
+        if index not in self.indexes:
+            # dispatcher answers 404
+            return None
+
+        with self.lock:
+            self.requested.append(index)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        # later indexes answer faster, so completion order differs from index order
+        time.sleep(0.01 * (len(self.indexes) - index))
+
+        with self.lock:
+            self.in_flight -= 1
+
+        return index
+
+class MockMapper:
+
+    def to_tournament(self, dapp):
+        return Tournament(dapp, "tournament {}".format(dapp), "original")
+
+class MockBlockchainDecorator:
+
+    def __init__(self):
+        self.batches = []
+
+    def apply(self, dapp, tournament):
+        tournament.playerCount = dapp * 10
+
+    def apply_all(self, dapps_and_tournaments):
+        self.batches.append(len(dapps_and_tournaments))
+        for dapp, tournament in dapps_and_tournaments:
+            self.apply(dapp, tournament)
+
+class TestFetcher(unittest.TestCase):
+
+    def _get_fetcher(self, indexes, max_in_flight):
+        fetcher = tru.Fetcher(const.PLAYER_OWN_ADD, max_in_flight=max_in_flight)
+        fetcher.dispatcher_api = MockDispatcherAPI(indexes)
+        fetcher.mapper = MockMapper()
+        fetcher.blockchainDecorator = MockBlockchainDecorator()
+        return fetcher
+
+    def test_serial(self):
+        fetcher = self._get_fetcher(list(range(5)), 1)
+        original_batch_reads = const.BLOCKCHAIN_BATCH_READS
+
+        try:
+            const.BLOCKCHAIN_BATCH_READS = False
+            tournaments = fetcher.get_all_tournaments()
+        finally:
+            const.BLOCKCHAIN_BATCH_READS = original_batch_reads
+
+        self.assertEqual([t.id for t in tournaments], list(range(5)))
+        self.assertEqual([t.playerCount for t in tournaments], [i * 10 for i in range(5)])
+        self.assertEqual(fetcher.dispatcher_api.max_in_flight, 1)
+
+    def test_concurrent_keeps_order(self):
+        fetcher = self._get_fetcher(list(range(12)), 3)
+        tournaments = fetcher.get_all_tournaments()
+
+        self.assertEqual([t.id for t in tournaments], list(range(12)))
+        self.assertEqual([t.playerCount for t in tournaments], [i * 10 for i in range(12)])
+        self.assertLessEqual(fetcher.dispatcher_api.max_in_flight, 3)
+        self.assertGreater(fetcher.dispatcher_api.max_in_flight, 1)
+
+    def test_batched_decoration(self):
+        fetcher = self._get_fetcher(list(range(4)), 2)
+        original_batch_reads = const.BLOCKCHAIN_BATCH_READS
+
+        try:
+            const.BLOCKCHAIN_BATCH_READS = True
+            tournaments = fetcher.get_all_tournaments()
+        finally:
+            const.BLOCKCHAIN_BATCH_READS = original_batch_reads
+
+        self.assertEqual([t.playerCount for t in tournaments], [i * 10 for i in range(4)])
+        self.assertEqual(fetcher.blockchainDecorator.batches, [4])
+
+    def test_get_tournament_direct(self):
+        fetcher = self._get_fetcher(list(range(3)), 1)
+
+        tournament = fetcher.get_tournament("2")
+        self.assertEqual(tournament.id, 2)
+        self.assertEqual(tournament.playerCount, 20)
+
+        # unknown instance
+        self.assertIsNone(fetcher.get_tournament("7"))
+        self.assertEqual(fetcher.dispatcher_api.requested, [2])
+
+    def test_get_tournament_created_after_listing(self):
+        fetcher = self._get_fetcher(list(range(3)), 1)
+        fetcher.get_all_tournaments()
+        fetcher.dispatcher_api.requested = []
+
+        # the tournament didn't exist when all of them were listed
+        fetcher.dispatcher_api.indexes = list(range(8))
+        self.assertEqual(fetcher.get_tournament("7").id, 7)
+        self.assertEqual(fetcher.dispatcher_api.requested, [7])
+
+    def test_no_tournaments(self):
+        fetcher = self._get_fetcher([], 3)
+        self.assertEqual(fetcher.get_all_tournaments(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
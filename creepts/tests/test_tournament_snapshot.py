@@ -0,0 +1,275 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+os.environ['ACCOUNT_ADDRESS'] = "0x760841c050d07d3f74139154284d1cd8b5afa9c6"
+os.environ['CONTRACTS_DIR'] = "/"
+
+from creepts import constants as const
+
+#Keep the test database out of the source tree
+const.DB_NAME = os.path.join(tempfile.mkdtemp(), "creepts_test.db")
+
+from creepts.model.tournament import Tournament, TournamentPhase
+from creepts.utils.tournament_snapshot import SnapshotPoller, TournamentSnapshot, encode_cursor, decode_cursor
+
+class MockFetcher:
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.on_fetch = None
+
+    def get_all_tournaments(self):
+        self.calls += 1
+        if self.on_fetch:
+            self.on_fetch()
+        if self.error:
+            raise self.error
+        return [Tournament(i, "tournament {}".format(i), "original") for i in range(3)]
+
+    def populate_scores_from_db(self, tournaments):
+        return tournaments
+
+class TestSnapshotPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.fetcher = MockFetcher()
+        # long interval, refreshes are triggered by hand
+        self.poller = SnapshotPoller(self.fetcher, interval=3600)
+
+    def tearDown(self):
+        self.poller.stop()
+
+    def test_first_read_fills_snapshot(self):
+        snapshot = self.poller.get_snapshot()
+
+        self.assertEqual([t.id for t in snapshot.tournaments], [0, 1, 2])
+        self.assertEqual(snapshot.get("1").name, "tournament 1")
+        self.assertIsNone(snapshot.get(5))
+
+        # following reads come from memory
+        self.assertIs(self.poller.get_snapshot(), snapshot)
+        self.assertEqual(self.fetcher.calls, 1)
+
+    def test_failed_refresh_keeps_snapshot(self):
+        snapshot = self.poller.get_snapshot()
+
+        self.fetcher.error = RuntimeError("dispatcher unavailable")
+        self.assertRaises(RuntimeError, self.poller.refresh)
+
+        self.assertIs(self.poller.get_snapshot(), snapshot)
+        self.assertEqual(self.poller.last_error, "dispatcher unavailable")
+
+        self.fetcher.error = None
+        self.poller.refresh()
+        self.assertIsNot(self.poller.get_snapshot(), snapshot)
+        self.assertIsNone(self.poller.last_error)
+
+    def test_listeners(self):
+        snapshots = []
+        self.poller.add_listener(snapshots.append)
+        self.poller.add_listener(snapshots.append)
+
+        # a failing listener doesn't stop the refresh nor the others
+        self.poller.add_listener(lambda snapshot: 1 / 0)
+
+        self.poller.refresh()
+        self.assertEqual(snapshots, [self.poller.get_snapshot()])
+
+    def test_update_score_copies_tournament(self):
+        snapshot = self.poller.get_snapshot()
+        self.poller.update_score("2", const.PLAYER_OWN_ADD, {"score": 10, "waves": 2})
+
+        new_snapshot = self.poller.get_snapshot()
+        self.assertEqual(new_snapshot.get(2).scores, {const.PLAYER_OWN_ADD: {"score": 10, "waves": 2}})
+        self.assertEqual(new_snapshot.created_at, snapshot.created_at)
+
+        # the previous snapshot is left untouched
+        self.assertEqual(snapshot.get(2).scores, {})
+        self.assertIs(new_snapshot.get(1), snapshot.get(1))
+
+    def test_update_score_during_refresh(self):
+        self.poller.get_snapshot()
+
+        # stored after the refresh read the database
+        score = {"score": 10, "waves": 2}
+        self.fetcher.on_fetch = lambda: self.poller.update_score("2", const.PLAYER_OWN_ADD, score)
+        self.poller.refresh()
+
+        self.assertEqual(self.poller.get_snapshot().get(2).scores, {const.PLAYER_OWN_ADD: score})
+
+        # only replayed onto the refresh it happened during
+        self.fetcher.on_fetch = None
+        self.poller.refresh()
+        self.assertEqual(self.poller.get_snapshot().get(2).scores, {})
+
+def tournament(tour_id, player_count, deadline_hours):
+    tour = Tournament(tour_id, "tournament {}".format(tour_id), "original")
+    tour.playerCount = player_count
+    if deadline_hours is not None:
+        tour.deadline = datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(hours=deadline_hours)
+    return tour
+
+class TestSnapshotOrderings(unittest.TestCase):
+
+    def ids(self, snapshot, sort_by=None, descending=False):
+        return [tour.id for tour in snapshot.ordered(sort_by, descending)]
+
+    def test_ordered(self):
+        snapshot = TournamentSnapshot([
+            tournament(0, 5, 3),
+            tournament(1, 2, None),
+            tournament(2, 5, 1),
+            tournament(3, 9, 2)], 0)
+
+        self.assertEqual(self.ids(snapshot), [0, 1, 2, 3])
+        self.assertEqual(self.ids(snapshot, descending=True), [3, 2, 1, 0])
+
+        # ties broken by id
+        self.assertEqual(self.ids(snapshot, "playerCount"), [1, 0, 2, 3])
+        self.assertEqual(self.ids(snapshot, "playerCount", True), [3, 2, 0, 1])
+
+        # no deadline goes last either way
+        self.assertEqual(self.ids(snapshot, "deadline"), [2, 3, 0, 1])
+        self.assertEqual(self.ids(snapshot, "deadline", True), [0, 3, 2, 1])
+
+    def test_incremental_matches_full_sort(self):
+        rand = random.Random(42)
+        tournaments = [tournament(i, rand.randrange(5), rand.choice([None, 1, 2, 3])) for i in range(50)]
+        snapshot = TournamentSnapshot(tournaments, 0)
+
+        for _ in range(10):
+            # some tournaments change, some go away and new ones show up
+            tournaments = [tournament(t.id, rand.randrange(5), 1) if rand.random() < 0.2 else t for t in tournaments if rand.random() < 0.9]
+            tournaments += [tournament(rand.randrange(50, 1000), rand.randrange(5), rand.choice([None, 4])) for _ in range(3)]
+            tournaments = list({t.id: t for t in tournaments}.values())
+
+            snapshot = TournamentSnapshot(tournaments, 0, snapshot)
+            fresh = TournamentSnapshot(tournaments, 0)
+
+            for sort_by in ("playerCount", "deadline"):
+                for descending in (False, True):
+                    self.assertEqual(self.ids(snapshot, sort_by, descending), self.ids(fresh, sort_by, descending))
+
+    def test_incremental_all_changed(self):
+        tournaments = [tournament(i, i, i % 3 or None) for i in range(20)]
+        snapshot = TournamentSnapshot(tournaments, 0)
+
+        # every key moves, the previous order is reversed
+        tournaments = [tournament(t.id, 20 - t.id, t.id % 2 or None) for t in tournaments]
+        snapshot = TournamentSnapshot(tournaments, 0, snapshot)
+        fresh = TournamentSnapshot(tournaments, 0)
+
+        for sort_by in ("playerCount", "deadline"):
+            for descending in (False, True):
+                self.assertEqual(self.ids(snapshot, sort_by, descending), self.ids(fresh, sort_by, descending))
+
+        # both directions are built with the snapshot, not per request
+        self.assertIs(snapshot._ordering("deadline", True), snapshot._ordering("deadline", True))
+
+    def test_select(self):
+        tournaments = [tournament(i, 10 - i, None) for i in range(6)]
+        for tour in tournaments:
+            tour.phase = TournamentPhase.ROUND if tour.id % 2 else TournamentPhase.COMMIT
+        tournaments[1].scores = {const.PLAYER_OWN_ADD: {"score": 1, "waves": 1}}
+        snapshot = TournamentSnapshot(tournaments, 0)
+
+        self.assertEqual([t.id for t in snapshot.select()], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([t.id for t in snapshot.select("round")], [1, 3, 5])
+        self.assertEqual([t.id for t in snapshot.select("round", sort_by="playerCount")], [5, 3, 1])
+        self.assertEqual([t.id for t in snapshot.select("round", me=False)], [3, 5])
+        self.assertEqual([t.id for t in snapshot.select(me=True)], [1])
+        self.assertEqual(snapshot.select("end"), ())
+
+        # built once per snapshot
+        self.assertIs(snapshot.select("round"), snapshot.select("round"))
+
+        # joining a tournament shows in the indexes of the updated snapshot
+        new_snapshot = snapshot.with_score(3, const.PLAYER_OWN_ADD, {"score": 10, "waves": 2})
+        self.assertEqual([t.id for t in new_snapshot.select("round", me=True)], [1, 3])
+        self.assertEqual([t.id for t in snapshot.select("round", me=True)], [1])
+
+    def test_selections_carried_over(self):
+        tournaments = [tournament(i, 10 - i, None) for i in range(6)]
+        snapshot = TournamentSnapshot(tournaments, 0)
+        snapshot.select(me=False, sort_by="playerCount", descending=True)
+
+        # the selections asked for are built with the next snapshots, from their own tournaments
+        new_snapshot = snapshot.with_score(3, const.PLAYER_OWN_ADD, {"score": 10, "waves": 2})
+        self.assertEqual(list(new_snapshot._selections), [(None, False, "playerCount", True)])
+        self.assertEqual([t.id for t in new_snapshot.select(me=False, sort_by="playerCount", descending=True)], [0, 1, 2, 4, 5])
+
+        refreshed = TournamentSnapshot(tournaments[:4], 0, new_snapshot)
+        self.assertEqual([t.id for t in refreshed._selections[(None, False, "playerCount", True)][0]], [0, 1, 2, 3])
+
+    def test_cursor_pages(self):
+        tournaments = [tournament(i, i % 3, i % 4 or None) for i in range(10)]
+        snapshot = TournamentSnapshot(tournaments, 0)
+
+        for sort_by in (None, "playerCount", "deadline"):
+            for descending in (False, True):
+                pages, after = [], None
+                while True:
+                    page, after = snapshot.page(sort_by=sort_by, descending=descending, after=after, limit=3)
+                    pages.append([t.id for t in page])
+                    if after is None:
+                        break
+
+                # the pages are the sorted tournaments, split by 3
+                ids = self.ids(snapshot, sort_by, descending)
+                self.assertEqual(pages, [ids[i:i + 3] for i in range(0, 10, 3)])
+
+    def test_cursor_stable(self):
+        tournaments = [tournament(i, i, None) for i in range(6)]
+        page, after = TournamentSnapshot(tournaments, 0).page(sort_by="playerCount", limit=3)
+        self.assertEqual([t.id for t in page], [0, 1, 2])
+
+        # the cursor survives the encoding, and its tournament going away or changing
+        sort_by, descending, after = decode_cursor(encode_cursor("playerCount", False, after))
+        snapshot = TournamentSnapshot([tournament(1, 9, None) if t.id == 1 else t for t in tournaments if t.id != 2], 0)
+        page, _ = snapshot.page(sort_by=sort_by, descending=descending, after=after)
+        self.assertEqual([t.id for t in page], [3, 4, 5, 1])
+
+    def test_cursor_encoding(self):
+        key = (False, datetime(2020, 1, 1, tzinfo=timezone.utc), 7)
+        self.assertEqual(decode_cursor(encode_cursor("deadline", True, key)), ("deadline", True, key))
+        self.assertEqual(decode_cursor(encode_cursor(None, False, (False, 7, 7))), (None, False, (False, 7, 7)))
+
+        crafted = [
+            encode_cursor("name", False, (False, 1, 1)),
+            encode_cursor("deadline", False, (False, 5, 1)),
+            encode_cursor("deadline", False, (False, "2020-01-01T00:00:00", 1)),
+            encode_cursor("playerCount", False, (False, "5", 1)),
+            encode_cursor("playerCount", False, (False, 5, "1")),
+            encode_cursor("playerCount", False, (True, "5", 1))]
+
+        for cursor in ["", "not a cursor"] + crafted:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_score_update_keeps_orderings(self):
+        snapshot = TournamentSnapshot([tournament(0, 5, 3), tournament(1, 2, 1)], 0)
+        new_snapshot = snapshot.with_score(1, const.PLAYER_OWN_ADD, {"score": 10, "waves": 2})
+
+        self.assertEqual(self.ids(new_snapshot, "playerCount"), [1, 0])
+        self.assertEqual(next(new_snapshot.ordered("playerCount")).scores, {const.PLAYER_OWN_ADD: {"score": 10, "waves": 2}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,14 +13,48 @@ specific language governing permissions and limitations under the License.
 
 from web3 import Web3
 from web3.auto import w3
+from eth_abi import decode_abi
+import os
 import logging
 import json
+import time
+import threading
+import requests
 
 from .. import constants as const
+from .single_flight import SingleFlight
 
 # keep a cache of web3 contract instance by the contract name
 CONTRACT_CACHE={}
 
+# keep a cache of contract reads keyed by (function name, reveal index, args, block number)
+CALL_CACHE={}
+CALL_CACHE_STATS={"hits": 0, "misses": 0, "rpc_calls": 0}
+_CALL_CACHE_LOCK = threading.Lock()
+# cache misses of the same read at once go to the node once
+_FLIGHTS = SingleFlight("blockchain")
+
+# latest block number known and when it was checked, as (block number, monotonic time)
+_LATEST_BLOCK = (None, 0)
+
+# http session used to send JSON-RPC batches to the node, by process
+_RPC_SESSION = None
+_RPC_SESSION_PID = None
+
+# aggregate function of the makerdao Multicall contract
+MULTICALL_ABI = [{
+    "name": "aggregate",
+    "type": "function",
+    "stateMutability": "view",
+    "constant": True,
+    "inputs": [{"name": "calls", "type": "tuple[]", "components": [
+        {"name": "target", "type": "address"},
+        {"name": "callData", "type": "bytes"}]}],
+    "outputs": [
+        {"name": "blockNumber", "type": "uint256"},
+        {"name": "returnData", "type": "bytes[]"}]
+}]
+
 def is_address(address):
     return Web3.isAddress(address) and Web3.isChecksumAddress(address)
 
@@ -28,6 +62,40 @@ def get_network_id():
     # pylint: disable=no-member
     return w3.net.version
 
+def get_latest_block_number():
+    """
+    Returns the latest block number, asking the node at most once every
+    BLOCK_CHECK_INTERVAL seconds. Cached reads of older blocks are dropped
+    whenever a new block is seen
+    """
+    global _LATEST_BLOCK
+
+    block_number, checked_at = _LATEST_BLOCK
+    now = time.monotonic()
+
+    if block_number is None or now - checked_at >= const.BLOCK_CHECK_INTERVAL:
+        # pylint: disable=no-member
+        block_number = w3.eth.blockNumber
+
+        with _CALL_CACHE_LOCK:
+            CALL_CACHE_STATS["rpc_calls"] += 1
+            if block_number != _LATEST_BLOCK[0]:
+                for key in [k for k in CALL_CACHE.keys() if k[3] != block_number]:
+                    del CALL_CACHE[key]
+            _LATEST_BLOCK = (block_number, now)
+
+    return block_number
+
+def get_cache_stats():
+    """Returns the counters of the contract reads cache and its hit ratio"""
+    with _CALL_CACHE_LOCK:
+        stats = dict(CALL_CACHE_STATS)
+        stats["entries"] = len(CALL_CACHE)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
 def get_number_of_players(dapp):
 
     tournament_id = dapp.index
@@ -46,7 +114,7 @@ def get_number_of_players(dapp):
     reveal_instance = _get_contract_instance(reveal)
 
     # call the contract function
-    number_of_players = reveal_instance.functions.getNumberOfPlayers(reveal.index).call()
+    number_of_players = _cached_call(reveal_instance, reveal, "getNumberOfPlayers")
 
     logging.info("Number of players in tournament %d: %d", tournament_id, number_of_players)
 
@@ -75,7 +143,7 @@ def player_exists(dapp, address):
     reveal_instance = _get_contract_instance(reveal)
 
     # call the contract function
-    exists = reveal_instance.functions.playerExist(reveal.index, address).call()
+    exists = _cached_call(reveal_instance, reveal, "playerExist", address)
 
     logging.info("Player %s exists in tournament %d: %r", address, tournament_id, exists)
 
@@ -112,7 +180,7 @@ def get_player_score(dapp, address):
     logging.debug("Got reveal instantiator contract manipulation instance")
 
     # get score from blockchain
-    score = reveal_instance.functions.getScore(reveal.index, address).call()
+    score = _cached_call(reveal_instance, reveal, "getScore", address)
     logging.info("Score for player %s in tournament %d is %d", address, tournament_id, score)
 
     return score
@@ -134,7 +202,7 @@ def get_player_hash(dapp, address):
     logging.debug("Got reveal instantiator contract manipulation instance")
 
     # get commit hash from blockchain
-    commit_hash = reveal_instance.functions.getLogHash(reveal.index, address).call()
+    commit_hash = _cached_call(reveal_instance, reveal, "getLogHash", address)
 
     # convert to hex string
     commit_hash = Web3.toHex(commit_hash)
@@ -143,6 +211,129 @@ def get_player_hash(dapp, address):
 
     return commit_hash
 
+def batch_call(calls):
+    """
+    Executes the given reveal contract reads, a list of
+    (dapp, function name, args tuple), and returns their results in the
+    same order. Reads cached for the latest block are served from memory,
+    the remaining ones are sent together in a single multicall, when a
+    Multicall contract address is configured, or JSON-RPC batch request.
+    Falls back to one call at a time when the node is not reachable by http
+    """
+    block_number = get_latest_block_number()
+    results = [None] * len(calls)
+    pending = []
+
+    for i, (dapp, function_name, args) in enumerate(calls):
+        reveal = _get_reveal(dapp)
+        key = (function_name, reveal.index, tuple(args), block_number)
+
+        with _CALL_CACHE_LOCK:
+            if key in CALL_CACHE:
+                CALL_CACHE_STATS["hits"] += 1
+                results[i] = CALL_CACHE[key]
+                continue
+            CALL_CACHE_STATS["misses"] += 1
+
+        pending.append((i, key, _get_contract_instance(reveal), reveal, function_name, tuple(args)))
+
+    if not pending:
+        return results
+
+    if const.MULTICALL_ADDRESS:
+        values = _multicall(pending, block_number)
+    elif const.WEB3_PROVIDER_URI.startswith("http"):
+        values = _json_rpc_batch(pending, block_number)
+    else:
+        values = []
+        for (_, _, contract_instance, reveal, function_name, args) in pending:
+            function = getattr(contract_instance.functions, function_name)
+            values.append(function(reveal.index, *args).call(block_identifier=block_number))
+        with _CALL_CACHE_LOCK:
+            CALL_CACHE_STATS["rpc_calls"] += len(pending)
+
+    with _CALL_CACHE_LOCK:
+        for (i, key, _, _, _, _), value in zip(pending, values):
+            results[i] = value
+            # only keep it if no newer block was seen meanwhile
+            if _LATEST_BLOCK[0] == block_number:
+                CALL_CACHE[key] = value
+
+    return results
+
+def _encode_call(contract_instance, reveal, function_name, args):
+    """Returns the call data and output types of a reveal contract read"""
+    function = getattr(contract_instance.functions, function_name)(reveal.index, *args)
+    data = contract_instance.encodeABI(fn_name=function_name, args=[reveal.index, *args])
+    output_types = [output["type"] for output in function.abi["outputs"]]
+    return data, output_types
+
+def _decode_result(output_types, raw):
+    values = decode_abi(output_types, raw)
+    return values[0] if len(values) == 1 else values
+
+def _json_rpc_batch(pending, block_number):
+    requests_batch = []
+    output_types = []
+
+    for i, (_, _, contract_instance, reveal, function_name, args) in enumerate(pending):
+        data, types = _encode_call(contract_instance, reveal, function_name, args)
+        output_types.append(types)
+        requests_batch.append({
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "eth_call",
+            "params": [{"to": contract_instance.address, "data": data}, hex(block_number)]
+        })
+
+    logging.debug("Sending batch of %d eth_call requests at block %d", len(requests_batch), block_number)
+    response = _get_rpc_session().post(const.WEB3_PROVIDER_URI, json=requests_batch, timeout=const.WEB3_REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    with _CALL_CACHE_LOCK:
+        CALL_CACHE_STATS["rpc_calls"] += 1
+
+    # responses of a batch may come in any order
+    responses = {item["id"]: item for item in response.json()}
+
+    values = []
+    for i, types in enumerate(output_types):
+        item = responses.get(i)
+        if item is None or "error" in item:
+            error = "Batched eth_call {} failed: {}".format(pending[i][4], item["error"] if item else "missing response")
+            logging.error(error)
+            raise RuntimeError(error)
+        values.append(_decode_result(types, Web3.toBytes(hexstr=item["result"])))
+
+    return values
+
+def _multicall(pending, block_number):
+    multicall = w3.eth.contract(address=Web3.toChecksumAddress(const.MULTICALL_ADDRESS), abi=MULTICALL_ABI)
+
+    calls = []
+    output_types = []
+    for (_, _, contract_instance, reveal, function_name, args) in pending:
+        data, types = _encode_call(contract_instance, reveal, function_name, args)
+        output_types.append(types)
+        calls.append((contract_instance.address, Web3.toBytes(hexstr=data)))
+
+    logging.debug("Sending multicall of %d calls at block %d", len(calls), block_number)
+    _, return_data = multicall.functions.aggregate(calls).call(block_identifier=block_number)
+
+    with _CALL_CACHE_LOCK:
+        CALL_CACHE_STATS["rpc_calls"] += 1
+
+    return [_decode_result(types, raw) for types, raw in zip(output_types, return_data)]
+
+def _get_rpc_session():
+    global _RPC_SESSION, _RPC_SESSION_PID
+
+    if _RPC_SESSION is None or _RPC_SESSION_PID != os.getpid():
+        _RPC_SESSION = requests.Session()
+        _RPC_SESSION_PID = os.getpid()
+
+    return _RPC_SESSION
+
 def _get_reveal(dapp):
     # get the reveal child contract
     reveal = next((child for child in dapp.children if child.name == 'RevealCommit'), None)
@@ -155,14 +346,52 @@ def _get_reveal(dapp):
 
     return reveal
 
+def _cached_call(contract_instance, reveal, function_name, *args):
+    """
+    Calls the given function of the reveal contract instance at the latest
+    block, serving repeated calls for the same block from memory
+    """
+    block_number = get_latest_block_number()
+    key = (function_name, reveal.index, args, block_number)
+
+    with _CALL_CACHE_LOCK:
+        if key in CALL_CACHE:
+            CALL_CACHE_STATS["hits"] += 1
+            return CALL_CACHE[key]
+        CALL_CACHE_STATS["misses"] += 1
+
+    return _FLIGHTS.do(key, _uncached_call, key, contract_instance, reveal)
+
+def _uncached_call(key, contract_instance, reveal):
+    function_name, _, args, block_number = key
+
+    with _CALL_CACHE_LOCK:
+        CALL_CACHE_STATS["rpc_calls"] += 1
+
+    # read at the pinned block so the cached value matches its key
+    function = getattr(contract_instance.functions, function_name)
+    value = function(reveal.index, *args).call(block_identifier=block_number)
+
+    with _CALL_CACHE_LOCK:
+        # only keep it if no newer block was seen meanwhile
+        if _LATEST_BLOCK[0] == block_number:
+            CALL_CACHE[key] = value
+
+    return value
+
 def _get_contract_instance(contract):
     """
     Returns an instance web3 contract manipulator of the given contract object
     and network of the active ethereum node using data available from the
     truffle deployment file
     """
-    contract_name = contract.name
-    
+    return get_contract_instance_by_name(contract.name)
+
+def get_contract_instance_by_name(contract_name):
+    """
+    Returns an instance web3 contract manipulator of the contract with the
+    given name, see _get_contract_instance
+    """
     # return from contract instances cache, if in there
     if contract_name in CONTRACT_CACHE.keys():
         return CONTRACT_CACHE[contract_name]
@@ -0,0 +1,170 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from .. import constants as const
+from . import blockchain_utils
+
+LOGGER = logging
+
+EMPTY_HASH = b'\x00' * 32
+
+class ChainIndex:
+    """
+    Local index of the per-player commit hashes and scores of every reveal
+    instance, kept up to date by following the RevealInstantiator events
+    block after block instead of querying the contract on every read. Only
+    blocks with enough confirmations are indexed, as the events of the
+    blocks dropped by a reorganization can't be taken back
+    """
+
+    def __init__(self, contract, web3, from_block = const.CHAIN_INDEX_FROM_BLOCK,
+                 commit_event = const.CHAIN_INDEX_COMMIT_EVENT,
+                 reveal_event = const.CHAIN_INDEX_REVEAL_EVENT,
+                 confirmations = const.CHAIN_INDEX_CONFIRMATIONS):
+        self.contract = contract
+        self.web3 = web3
+        self.commit_event = commit_event
+        self.reveal_event = reveal_event
+        self.confirmations = confirmations
+        self.last_block = from_block - 1
+        self.synced_at = None
+        # reveal index -> player address -> {"hash": bytes, "score": int}
+        self._players = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def sync(self):
+        """Applies the events of every block confirmed since the last sync"""
+        with self._sync_lock:
+            # pylint: disable=no-member
+            latest = self.web3.eth.blockNumber - self.confirmations
+
+            while self.last_block < latest:
+                # walk big gaps in chunks, nodes limit the size of log queries
+                from_block = self.last_block + 1
+                to_block = min(latest, from_block + const.CHAIN_INDEX_BLOCK_RANGE - 1)
+
+                logs = []
+                for event_name in (self.commit_event, self.reveal_event):
+                    logs += self.contract.events[event_name].getLogs(fromBlock=from_block, toBlock=to_block)
+
+                # the node may still return logs of blocks being reorganized away
+                logs = [log for log in logs if not log.get("removed", False)]
+
+                # apply them in chain order
+                logs.sort(key=lambda log: (log["blockNumber"], log["logIndex"]))
+
+                with self._lock:
+                    for log in logs:
+                        self._apply(log)
+                    self.last_block = to_block
+
+                LOGGER.debug("Chain index applied %d events from blocks %d to %d", len(logs), from_block, to_block)
+
+            self.synced_at = time.monotonic()
+
+    def _apply(self, log):
+        args = log["args"]
+        reveal_index = _get_arg(args, "index")
+        player = _get_arg(args, "player")
+        entry = self._players.setdefault(reveal_index, {}).setdefault(player, {})
+
+        if log["event"] == self.commit_event:
+            entry["hash"] = bytes(_get_arg(args, "logHash", "hash"))
+        elif log["event"] == self.reveal_event:
+            entry["score"] = _get_arg(args, "score")
+
+    def is_synced(self):
+        """Returns if the index was synced recently enough to be read instead of the contract"""
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= const.CHAIN_INDEX_MAX_LAG
+
+    def read(self, dapp, function_name, args):
+        """Answers a reveal contract read of the given dapp from the index, with the same result the contract gives"""
+        reveal_index = blockchain_utils._get_reveal(dapp).index
+
+        with self._lock:
+            players = self._players.get(reveal_index, {})
+
+            if function_name == "getNumberOfPlayers":
+                return sum(1 for entry in players.values() if "hash" in entry)
+
+            entry = players.get(args[0], {})
+
+            if function_name == "playerExist":
+                return "hash" in entry
+            if function_name == "getScore":
+                return entry.get("score", 0)
+            if function_name == "getLogHash":
+                return entry.get("hash", EMPTY_HASH)
+
+        raise ValueError("Contract function {} is not indexed".format(function_name))
+
+    def start(self):
+        """Starts following the chain in a background thread, once per process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="chain-index", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                LOGGER.error("Failed to sync chain index")
+                LOGGER.exception(e)
+            self._stop.wait(const.CHAIN_INDEX_POLL_INTERVAL)
+
+def _get_arg(args, *names):
+    """Returns the first event argument found among the given names, with or without a leading underscore"""
+    for name in names:
+        for key in (name, "_" + name):
+            if key in args:
+                return args[key]
+
+    raise KeyError("Event has none of the arguments {}".format(names))
+
+# a single index for the whole process, when enabled
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_index():
+    """Returns the running process wide chain index, or None if it is disabled"""
+    global _INDEX
+
+    if not const.CHAIN_INDEX_ENABLED:
+        return None
+
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            contract = blockchain_utils.get_contract_instance_by_name("RevealCommit")
+            _INDEX = ChainIndex(contract, blockchain_utils.w3)
+
+    _INDEX.start()
+    return _INDEX
@@ -0,0 +1,150 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import logging
+import threading
+
+from .. import constants as const
+from ..db import commit_jobs
+from ..dispatcher import api
+from . import hash_utils
+
+LOGGER = logging
+
+class CommitError(Exception):
+    pass
+
+def commit_log(dispatcher_api, tournament_id, game_log):
+    """
+    Packs the given game log into its drive, calculates the drive merkle
+    root hash and commits it to the given tournament, returns the hash
+    """
+    #Drive file with the tournament_id as name
+    packed_log_filename = "{}{}.json.{}".format(const.LOG_FILES_OUTPUT_DIR, tournament_id, const.PACKED_LOG_EXT)
+    LOGGER.info("Writing log drive with filename %s", packed_log_filename)
+
+    #Compress and archive the log
+    packed_log = hash_utils.pack_log(game_log)
+
+    #Write it with the expected final size, the zero tail is left sparse
+    if not hash_utils.write_log_drive(packed_log_filename, packed_log):
+        raise CommitError("Error writing the compressed and archived game log drive")
+
+    #Calculate the merkle tree root hash of it, from the packed log and the implicit zero tail
+    calculated_hash = hash_utils.log_drive_hash(packed_log)
+
+    if not calculated_hash:
+        raise CommitError("Error calculating the merkle root hash of the compressed, archieved and truncated game log file")
+
+    #Format the post payload
+    payload = {
+        "action": "commit",
+        "params": {
+            "hash": calculated_hash
+        }
+    }
+
+    #Commit the game log
+    LOGGER.debug("Committing log to the dispatcher")
+    dispatcher_resp = dispatcher_api.post(int(tournament_id), json.dumps(payload))
+
+    if (dispatcher_resp.status_code != 200):
+        LOGGER.error("Failed to commit gamelog for tournament id {} and game log file name {}. Response content was {}".format(tournament_id, packed_log_filename, dispatcher_resp.text))
+        raise CommitError("Failed to commit the gamelog for tournament id {} and game log filename {}".format(tournament_id, packed_log_filename))
+
+    return calculated_hash
+
+class CommitWorkers:
+    """
+    Pool of background threads running the queued commit jobs, each
+    process runs its own pool over the shared queue
+    """
+
+    def __init__(self, dispatcher_api, workers = const.COMMIT_WORKERS):
+        self.dispatcher_api = dispatcher_api
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    def run_once(self):
+        """Runs the next ready job, if any, returns if there was one"""
+        job = commit_jobs.claim()
+        if not job:
+            return False
+
+        LOGGER.info("Running commit job %d for tournament %s, attempt %d", job["id"], job["tournament_id"], job["attempts"])
+        try:
+            commit_hash = commit_log(self.dispatcher_api, job["tournament_id"], job["log"])
+        except Exception as e:
+            LOGGER.exception(e)
+            commit_jobs.fail(job["id"], job["tournament_id"], job["attempts"], e)
+        else:
+            commit_jobs.complete(job["id"], commit_hash)
+            LOGGER.info("Commit job %d done with hash %s", job["id"], commit_hash)
+
+        return True
+
+    def start(self):
+        """Starts the worker threads, once per process"""
+        if self._threads and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            # threads don't survive a fork, a forked process starts its own
+            if not self._threads or self._pid != os.getpid():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._threads = [threading.Thread(target=self._run, name="commit-worker-{}".format(i), daemon=True) for i in range(self.workers)]
+                for thread in self._threads:
+                    thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wakes the workers up to run a newly queued job"""
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                LOGGER.error("Failed to run commit jobs")
+                LOGGER.exception(e)
+
+            self._wakeup.wait(const.COMMIT_JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+
+# a single pool for the whole process
+_WORKERS = None
+_WORKERS_LOCK = threading.Lock()
+
+def get_workers():
+    """Returns the running process wide commit workers"""
+    global _WORKERS
+
+    with _WORKERS_LOCK:
+        if _WORKERS is None:
+            _WORKERS = CommitWorkers(api.API(const.COMMIT_LOG_URL))
+
+    _WORKERS.start()
+    return _WORKERS
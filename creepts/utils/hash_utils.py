@@ -11,144 +11,287 @@ CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
 
-import subprocess
 import logging
+import json
+import io
 import os
 
+import brotli
+import sha3
+
 from .. import constants as const
 
 LOGGER = logging
 
+#The merkle tree leaves are the keccak-256 hashes of 8 byte words, like in the cartesi machine
+MERKLE_WORD_LOG2_SIZE = 3
+MERKLE_MAX_LOG2_SIZE = 64
+
+def _keccak(data):
+    return sha3.keccak_256(data).digest()
+
+def _zero_hashes():
+    #Root hashes of all-zero trees, indexed by the log2 of their size
+    hashes = [None] * MERKLE_WORD_LOG2_SIZE + [_keccak(b"\0" * (1 << MERKLE_WORD_LOG2_SIZE))]
+    for _ in range(MERKLE_WORD_LOG2_SIZE, MERKLE_MAX_LOG2_SIZE):
+        hashes.append(_keccak(hashes[-1] + hashes[-1]))
+    return hashes
+
+ZERO_HASHES = _zero_hashes()
+
+def _merkle_subtree(data, offset, log2_size, page_log2_size):
+    if offset >= len(data):
+        #Past the data everything is zero
+        return ZERO_HASHES[log2_size]
+
+    size = 1 << log2_size
+    if log2_size <= page_log2_size:
+        chunk = data[offset:offset + size]
+        if chunk.count(0) == len(chunk):
+            return ZERO_HASHES[log2_size]
+        if log2_size == MERKLE_WORD_LOG2_SIZE:
+            return _keccak(chunk.ljust(size, b"\0"))
+
+    half = size >> 1
+    return _keccak(_merkle_subtree(data, offset, log2_size - 1, page_log2_size) +
+                   _merkle_subtree(data, offset + half, log2_size - 1, page_log2_size))
+
+def merkle_root(data, page_log2_size=const.DEFAULT_PAGE_LOG2_BYTES_SIZE, merkle_tree_log2_size=const.DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE):
+    """
+    Returns the merkle tree root hash of a drive of 2^merkle_tree_log2_size
+    bytes starting with the given data and zero filled after it
+
+    Zero pages, and the whole zero tail of the drive, take their precomputed
+    hashes instead of being hashed word by word
+    """
+    if len(data) > (1 << merkle_tree_log2_size):
+        raise ValueError("Data of {} bytes doesn't fit a merkle tree of log2 size {}".format(len(data), merkle_tree_log2_size))
+    if not MERKLE_WORD_LOG2_SIZE <= page_log2_size <= merkle_tree_log2_size < MERKLE_MAX_LOG2_SIZE:
+        raise ValueError("Invalid page log2 size {} for a merkle tree of log2 size {}".format(page_log2_size, merkle_tree_log2_size))
+
+    #The zero tail of a truncated drive is no different from the implicit one
+    return _merkle_subtree(bytes(data).rstrip(b"\0"), 0, merkle_tree_log2_size, page_log2_size)
+
 def merkle_root_hash(file_path, page_log2_bytes_size=const.DEFAULT_PAGE_LOG2_BYTES_SIZE, merkle_tree_log2_bytes_size=const.DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE):
 
     LOGGER.info("Calculating the merkle tree root hash for file '{}' using log2 bytes size of {} for page and {} for tree".format(file_path, page_log2_bytes_size, merkle_tree_log2_bytes_size))
 
-    cmd_line = [const.HASH_BINARY_CMD, "--input={}".format(file_path), "--page-log2-size={}".format(page_log2_bytes_size), "--tree-log2-size={}".format(merkle_tree_log2_bytes_size)]
-    LOGGER.debug("Executing {}".format(" ".join(cmd_line)))
-    proc = None
     try:
-        proc = subprocess.Popen(" ".join(cmd_line), stderr=subprocess.PIPE, stdout=subprocess.PIPE, shell=True)
-        out, err = proc.communicate()
-        LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
+        with open(file_path, 'rb') as drive_file:
+            root_hash = merkle_root(drive_file.read(), page_log2_bytes_size, merkle_tree_log2_bytes_size)
     except Exception as e:
         LOGGER.exception(e)
-        err_msg = "Failed to calculate merkle tree root hash for file '{}'".format(file_path)
-        LOGGER.error(err_msg)
-        if (proc):
-            out, err = proc.communicate()
-            LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
+        LOGGER.error("Failed to calculate merkle tree root hash for file '{}'".format(file_path))
         return None
 
-    if (proc.returncode == 0):
-        #Return the calculated hash
-        return "0x{}".format(out.decode("utf-8").rstrip('\n'))
+    #Return the calculated hash
+    return "0x{}".format(root_hash.hex())
 
-    LOGGER.error("Failed to calculate merkle tree root hash for file '{}', processed returned non-zero code".format(file_path))
-    return None
+def log_drive_hash(packed_log, page_log2_bytes_size=const.DEFAULT_PAGE_LOG2_BYTES_SIZE, merkle_tree_log2_bytes_size=const.DEFAULT_MERKLE_TREE_LOG2_BYTES_SIZE):
+    """
+    Returns the merkle tree root hash of the drive holding the given packed
+    log followed by zeros, without reading the drive back from disk
+    """
+    try:
+        root_hash = merkle_root(packed_log, page_log2_bytes_size, merkle_tree_log2_bytes_size)
+    except Exception as e:
+        LOGGER.exception(e)
+        LOGGER.error("Failed to calculate the merkle tree root hash of the log drive")
+        return None
+
+    return "0x{}".format(root_hash.hex())
+
+#Brotli encoder settings of the brotli command line tool
+BROTLI_QUALITY = 11
+BROTLI_MIN_WINDOW_BITS = 10
+BROTLI_MAX_WINDOW_BITS = 24
+
+#newc cpio format, as written by "cpio -o -H newc"
+CPIO_NEWC_MAGIC = b"070701"
+CPIO_TRAILER_NAME = "TRAILER!!!"
+CPIO_BLOCK_SIZE = 512
+#Size of the header before the member name
+CPIO_NEWC_HEADER_SIZE = 110
+
+#Compressed bytes fed to the decompressor at a time when unpacking
+UNPACK_CHUNK_SIZE = 64 * 1024
+
+def _brotli_window_bits(size):
+    #Like the command line tool, use the smallest window that holds the whole input
+    window_bits = BROTLI_MIN_WINDOW_BITS
+    while (1 << window_bits) - 16 < size and window_bits < BROTLI_MAX_WINDOW_BITS:
+        window_bits += 1
+    return window_bits
+
+def _pad(length, alignment):
+    return b"\0" * (-length % alignment)
+
+def _cpio_newc_entry(name, data, ino=0, mode=0, nlink=1, mtime=0):
+    encoded_name = name.encode() + b"\0"
+    #ino, mode, uid, gid, nlink, mtime, filesize, devmajor, devminor, rdevmajor, rdevminor, namesize, check
+    fields = (ino, mode, 0, 0, nlink, mtime, len(data), 0, 0, 0, 0, len(encoded_name), 0)
+    header = CPIO_NEWC_MAGIC + b"".join(b"%08X" % field for field in fields) + encoded_name
+
+    #Both the header with the name and the data are 4 bytes aligned
+    return header + _pad(len(header), 4) + data + _pad(len(data), 4)
+
+def pack_log(log_bytes):
+    """
+    Compresses the given log with brotli and archives it in a newc cpio
+    archive with a single log.json.br member, the format the packlog script
+    writes, all in memory
+
+    The archive only depends on the log content: the member has a fixed
+    modification time and no owner, device or inode information. It is not
+    byte identical to the packlog output, whose cpio header has the inode,
+    mode, owner and device of the temporary file, and whose brotli stream
+    depends on the version of the brotli tool. The merkle root hash of a
+    log packed here must not be expected to match the one of the same log
+    packed by the script
+    """
+    compressed = brotli.compress(log_bytes, quality=BROTLI_QUALITY, lgwin=_brotli_window_bits(len(log_bytes)))
+
+    archive = _cpio_newc_entry(const.PACKED_LOG_MEMBER_NAME, compressed, ino=1,
+                               mode=const.PACKED_LOG_MEMBER_MODE, mtime=const.PACKED_LOG_MEMBER_MTIME)
+    archive += _cpio_newc_entry(CPIO_TRAILER_NAME, b"")
+
+    #cpio writes whole blocks
+    return archive + _pad(len(archive), CPIO_BLOCK_SIZE)
 
 def pack_log_file(file_path):
 
     logging.info("Compacting and arquiving file '{}'".format(file_path))
 
     packed_log_filename = "{}.{}".format(file_path, const.PACKED_LOG_EXT)
-    cmd_line = [const.PACKLOG_CMD, file_path, packed_log_filename]
-    logging.debug("Executing {}".format(" ".join(cmd_line)))
-
-    result = subprocess.run(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode == 0:
-        #Remove original file and return the packed log filename
-        os.remove(file_path)
-        return packed_log_filename
-    else:
-        logging.error('Error executing command: {}'.format(result.returncode))
-        logging.error(result.stderr.decode('utf-8'))
+
+    try:
+        with open(file_path, 'rb') as log_file:
+            packed_log = pack_log(log_file.read())
+
+        with open(packed_log_filename, 'wb') as packed_log_file:
+            packed_log_file.write(packed_log)
+    except Exception as e:
+        LOGGER.exception(e)
+        LOGGER.error("Failed to compress and archive file '{}'".format(file_path))
         return None
 
-    #proc = None
-    #try:
-    #    proc = subprocess.Popen(cmd_line, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    #    out, err = proc.communicate()
-    #    LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
-    #except Exception as e:
-    #    err_msg = "Failed to compact and archive file '{}'".format(file_path)
-    #    LOGGER.error(err_msg)
-    #    LOGGER.exception(e)
-    #    if (proc):
-    #        out, err = proc.communicate()
-    #        LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
-    #    return None
-
-    #if (proc.returncode == 0):
-    #    #Remove original file and return the packed log filename
-    #    os.remove(file_path)
-    #    return packed_log_filename
-
-    LOGGER.error("Failed to compress and archive file '{}', processed returned non-zero code".format(file_path))
-    return None
+    #Remove original file and return the packed log filename
+    os.remove(file_path)
+    return packed_log_filename
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Packed log is truncated")
+    return data
+
+def _find_cpio_member(stream, name):
+    """Moves the stream to the data of the given archive member and returns its size"""
+    while True:
+        header = _read_exactly(stream, CPIO_NEWC_HEADER_SIZE)
+        if header[:6] != CPIO_NEWC_MAGIC:
+            #Only zeros are left after the archive in a drive
+            raise ValueError("No {} member in the packed log".format(name))
+
+        #ino, mode, uid, gid, nlink, mtime, filesize, devmajor, devminor, rdevmajor, rdevminor, namesize, check
+        fields = [int(header[6 + 8 * i:14 + 8 * i], 16) for i in range(13)]
+        file_size = fields[6]
+        name_size = fields[11]
+
+        member_name = _read_exactly(stream, name_size + (-(CPIO_NEWC_HEADER_SIZE + name_size) % 4))[:name_size - 1].decode()
+        if member_name == name:
+            return file_size
+        if member_name == CPIO_TRAILER_NAME:
+            raise ValueError("No {} member in the packed log".format(name))
+
+        stream.seek(file_size + (-file_size % 4), io.SEEK_CUR)
+
+def _unpack_stream(stream):
+    file_size = _find_cpio_member(stream, const.PACKED_LOG_MEMBER_NAME)
+
+    #Decompress while reading, only the member is read from the drive
+    decompressor = brotli.Decompressor()
+    chunks = []
+    while file_size > 0:
+        chunk = _read_exactly(stream, min(file_size, UNPACK_CHUNK_SIZE))
+        chunks.append(decompressor.process(chunk))
+        file_size -= len(chunk)
+
+    if not decompressor.is_finished():
+        raise ValueError("Packed log has an incomplete brotli stream")
+
+    return b"".join(chunks)
+
+def unpack_log(packed_log):
+    """
+    Returns the log archived by pack_log in the given bytes, which may be
+    followed by the zero padding of a truncated log drive
+    """
+    return _unpack_stream(io.BytesIO(packed_log))
+
+def load_log_file(file_path):
+    """
+    Reads the packed log of the given log file path, as downloaded by the
+    logger, and returns the parsed log, without writing any file
+    """
+    packed_log_filename = "{}.{}".format(file_path, const.PACKED_LOG_EXT)
+
+    with open(packed_log_filename, 'rb') as packed_log_file:
+        return json.loads(_unpack_stream(packed_log_file))
 
 def unpack_log_file(file_path):
 
     logging.info("Unarchiving and unpacking file '{}'".format(file_path))
 
     packed_log_filename = "{}.{}".format(file_path, const.PACKED_LOG_EXT)
-    cmd_line = [const.UNPACKLOG_CMD, packed_log_filename, file_path]
-    LOGGER.debug("Executing {}".format(" ".join(cmd_line)))
-
-    result = subprocess.run(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode == 0:
-        os.remove(packed_log_filename)
-        return file_path
-    else:
-        logging.error('Error executing command: {}'.format(result.returncode))
-        logging.error(result.stderr.decode('utf-8'))
+
+    try:
+        with open(packed_log_filename, 'rb') as packed_log_file:
+            log_bytes = _unpack_stream(packed_log_file)
+
+        with open(file_path, 'wb') as log_file:
+            log_file.write(log_bytes)
+    except Exception as e:
+        LOGGER.exception(e)
+        LOGGER.error("Failed to unarchive and decompress file '{}'".format(packed_log_filename))
         return None
 
-#    proc = None
-#    try:
-#        proc = subprocess.Popen(cmd_line, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-#        out, err = proc.communicate()
-#        LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
-#    except Exception as e:
-#        err_msg = "Failed to unarchive and uncompress file '{}'".format(packed_log_filename)
-#        LOGGER.error(err_msg)
-#        LOGGER.exception(e)
-#        if (proc):
-#            out, err = proc.communicate()
-#            LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
-#        return None
-    
-#    if (proc.returncode == 0):
-#        #Remove original file and return the unpacked log filename
-#        os.remove(packed_log_filename)
-#        return file_path
-
-#    LOGGER.error("Failed to unarchive and decompress file '{}', processed returned non-zero code".format(packed_log_filename))
-#    return None
+    os.remove(packed_log_filename)
+    return file_path
+
+#Multipliers of the size suffixes accepted by the truncate command
+SIZE_SUFFIXES = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+def _parse_size(size):
+    size = str(size).upper()
+    suffix = size[-1] if size[-1:] in SIZE_SUFFIXES else ""
+    return int(size[:len(size) - len(suffix)]) * SIZE_SUFFIXES[suffix]
 
 def truncate_file(file_path, size=const.DEFAULT_TRUNCATE_SIZE):
 
     LOGGER.info("Truncating file '{}'".format(file_path))
 
-    cmd_line = [const.TRUNCATE_BIN, "-s", size, file_path]
-    LOGGER.debug("Executing {}".format(" ".join(cmd_line)))
-    proc = None
     try:
-        proc = subprocess.Popen(cmd_line, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        out, err = proc.communicate()
-        LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
+        #Growing the file leaves a hole, the zero tail takes no disk space or writes
+        os.truncate(file_path, _parse_size(size))
     except Exception as e:
-        err_msg = "Failed to truncate file '{}'".format(file_path)
-        LOGGER.error(err_msg)
         LOGGER.exception(e)
-        if (proc):
-            out, err = proc.communicate()
-            LOGGER.debug("\nStdout:\n{}\nStderr:\n{}".format(out.decode("utf-8"), err.decode("utf-8")))
-        return None
+        LOGGER.error("Failed to truncate file '{}'".format(file_path))
+        return False
+
+    return True
 
-    if (proc.returncode == 0):
-        #Return true
-        return True
+def write_log_drive(file_path, packed_log, size=const.DEFAULT_TRUNCATE_SIZE):
+    """Writes the given packed log as a sparse drive of the given size, returns if it succeeded"""
+    LOGGER.info("Writing log drive '{}'".format(file_path))
 
-    LOGGER.error("Failed to truncate file '{}', processed returned non-zero code".format(file_path))
-    return False
+    try:
+        with open(file_path, 'wb') as drive_file:
+            drive_file.write(packed_log)
+            drive_file.truncate(_parse_size(size))
+    except Exception as e:
+        LOGGER.exception(e)
+        LOGGER.error("Failed to write log drive '{}'".format(file_path))
+        return False
 
+    return True
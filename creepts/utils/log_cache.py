@@ -0,0 +1,143 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .. import constants as const
+
+LOGGER = logging
+
+class LogCache:
+    """
+    Bounded LRU cache of the serialized game logs served by the scores
+    resource, keyed by their commit hash. The most recently used ones are
+    kept in memory and the ones evicted from it spill over to a directory,
+    itself bounded. A commit hash always refers to the same log, so entries
+    never need to be invalidated
+    """
+
+    def __init__(self, max_entries = const.LOG_CACHE_SIZE, disk_dir = const.LOG_CACHE_DIR,
+                 max_disk_entries = const.LOG_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _get_path(self, commit_hash):
+        return os.path.join(self.disk_dir, "{}.json".format(commit_hash))
+
+    def get(self, commit_hash):
+        """Returns the serialized log of the given commit hash or None if it isn't cached"""
+        with self._lock:
+            log_json = self._entries.get(commit_hash)
+            if log_json is not None:
+                self._entries.move_to_end(commit_hash)
+                self.hits += 1
+                return log_json
+
+        log_json = self._read_disk(commit_hash)
+        if log_json is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self.put(commit_hash, log_json)
+        return log_json
+
+    def contains(self, commit_hash):
+        """Returns if the log of the given commit hash is cached, without counting it as a use"""
+        with self._lock:
+            if commit_hash in self._entries:
+                return True
+
+        return bool(self.disk_dir) and os.path.exists(self._get_path(commit_hash))
+
+    def put(self, commit_hash, log_json):
+        """Caches the serialized log of the given commit hash"""
+        evicted = []
+        with self._lock:
+            self._entries[commit_hash] = log_json
+            self._entries.move_to_end(commit_hash)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+
+        # disk writes happen out of the lock
+        for evicted_hash, evicted_json in evicted:
+            self._write_disk(evicted_hash, evicted_json)
+
+    def _read_disk(self, commit_hash):
+        if not self.disk_dir:
+            return None
+
+        path = self._get_path(commit_hash)
+        try:
+            with open(path) as log_file:
+                log_json = log_file.read()
+            # keep the recently used files from being evicted
+            os.utime(path)
+            return log_json
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, commit_hash, log_json):
+        if not self.disk_dir or os.path.exists(self._get_path(commit_hash)):
+            return
+
+        try:
+            # write to a temporary file first, so readers never see a partial log
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write(log_json)
+            os.replace(tmp_path, self._get_path(commit_hash))
+            self._trim_disk()
+        except Exception as e:
+            LOGGER.error("Failed to spill log %s over to disk", commit_hash)
+            LOGGER.exception(e)
+
+    def _trim_disk(self):
+        paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".json")]
+        if len(paths) <= self.max_disk_entries:
+            return
+
+        # least recently used first
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+# a single cache for the whole process
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache():
+    """Returns the process wide log cache"""
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LogCache()
+
+    return _CACHE
@@ -0,0 +1,160 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import json
+import time
+import logging
+import threading
+
+from .. import constants as const
+from . import hash_utils
+
+LOGGER = logging
+
+class _Download:
+    """State of a log being downloaded, guarded by the condition of its LogDownloads"""
+
+    def __init__(self):
+        self.polled = False
+        self.progress = 0
+        self.log_json = None
+        self.error = None
+        self.waiters = 0
+
+    @property
+    def done(self):
+        return self.log_json is not None or self.error is not None
+
+class LogDownloads:
+    """
+    Downloads of the logs requested by the scores resource. A single thread
+    polls the logger for each pending log until it is ready and caches it,
+    while any number of clients wait on its progress, so waiting clients
+    don't each call the logger. Polling stops when nobody waits anymore.
+    Clients waiting for long take a slot first, so they can't hold every
+    request thread of the process
+    """
+
+    def __init__(self, cache, download, poll_interval = const.LOG_DOWNLOAD_POLL_INTERVAL,
+                 max_waiters = const.LOG_DOWNLOAD_MAX_WAITERS):
+        self.cache = cache
+        self.download = download
+        self.poll_interval = poll_interval
+        # commit hash -> _Download
+        self._downloads = {}
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_waiters)
+
+    def hold(self):
+        """Takes a waiting slot without blocking, returns if there was one free"""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        """Gives back a waiting slot taken by hold"""
+        self._slots.release()
+
+    def wait(self, commit_hash, timeout = 0, progress = None):
+        """
+        Waits for the log of the given commit hash, starting its download
+        or joining the one in flight
+
+        Parameters
+        ----------
+        commit_hash : str
+            The commit hash of the log
+
+        timeout : float
+            Maximum seconds to wait after the first logger response
+
+        progress : int
+            If given, also stops waiting once the progress differs from it
+
+        Returns
+        -------
+        tuple
+            The serialized log, or None if it isn't ready, and the download progress
+        """
+        log_json = self.cache.get(commit_hash)
+        if log_json is not None:
+            return log_json, 100
+
+        with self._condition:
+            download = self._downloads.get(commit_hash)
+            if download is None:
+                download = _Download()
+                self._downloads[commit_hash] = download
+                threading.Thread(target=self._run, args=(commit_hash, download),
+                                 name="log-download-{}".format(commit_hash[:10]), daemon=True).start()
+
+            download.waiters += 1
+            try:
+                # always answer with what the logger reports, not the initial state
+                self._condition.wait_for(lambda: download.polled or download.done, const.LOGGER_REQUEST_TIMEOUT)
+                self._condition.wait_for(lambda: download.done or (progress is not None and download.progress != progress), timeout)
+            finally:
+                download.waiters -= 1
+
+            if download.error is not None:
+                raise download.error
+            return download.log_json, 100 if download.log_json is not None else download.progress
+
+    def _run(self, commit_hash, download):
+        try:
+            while True:
+                response = self.download(commit_hash)
+
+                if response['status'] == 0:
+                    log_json = json.dumps(hash_utils.load_log_file(response['path']))
+                    self.cache.put(commit_hash, log_json)
+                    with self._condition:
+                        download.log_json = log_json
+                        self._condition.notify_all()
+                    return
+
+                with self._condition:
+                    download.polled = True
+                    download.progress = response['progress']
+                    self._condition.notify_all()
+
+                time.sleep(self.poll_interval)
+
+                with self._condition:
+                    if not download.waiters:
+                        # nobody is waiting anymore, the next request polls again
+                        del self._downloads[commit_hash]
+                        return
+        except Exception as e:
+            LOGGER.error("Failed to download log %s", commit_hash)
+            LOGGER.exception(e)
+            with self._condition:
+                download.error = e
+                self._condition.notify_all()
+        finally:
+            # waiters hold their own reference, the next request starts over
+            with self._condition:
+                if self._downloads.get(commit_hash) is download:
+                    del self._downloads[commit_hash]
+
+# a single set of downloads for the whole process
+_DOWNLOADS = None
+_DOWNLOADS_LOCK = threading.Lock()
+
+def get_downloads(cache, download):
+    """Returns the process wide downloads filling the given cache"""
+    global _DOWNLOADS
+
+    with _DOWNLOADS_LOCK:
+        if _DOWNLOADS is None:
+            _DOWNLOADS = LogDownloads(cache, download)
+
+    return _DOWNLOADS
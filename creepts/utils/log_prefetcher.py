@@ -0,0 +1,110 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import constants as const
+from ..model.tournament import TournamentPhase
+from . import hash_utils
+
+LOGGER = logging
+
+#Log hash of a player that committed nothing
+EMPTY_LOG_HASH = "0x" + "00" * 32
+
+class LogPrefetcher:
+    """
+    Downloads the logs of the opponents and winners into the log cache as
+    soon as they show up in a tournaments snapshot, so the first viewers
+    don't wait for the logger
+    """
+
+    def __init__(self, cache, download, max_in_flight = const.LOG_PREFETCH_MAX_IN_FLIGHT,
+                 retry_interval = const.LOG_PREFETCH_RETRY_INTERVAL):
+        self.cache = cache
+        self.download = download
+        self.max_in_flight = max_in_flight
+        self.retry_interval = retry_interval
+        self._in_flight = set()
+        # commit hash -> time of the last failed attempt
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="log-prefetcher")
+
+    def on_snapshot(self, snapshot):
+        """Prefetches the opponent and winner logs of the tournaments of the given snapshot"""
+        for tour in snapshot.tournaments:
+            # logs are only known once the commit phase is over
+            if tour.phase in (None, TournamentPhase.COMMIT):
+                continue
+
+            for player in (tour.currentOpponent, tour.winner):
+                commit_hash = tour.scores.get(player, {}).get('hash') if player else None
+                if commit_hash and commit_hash != EMPTY_LOG_HASH:
+                    self.prefetch(commit_hash)
+
+    def prefetch(self, commit_hash):
+        """Starts downloading the given log unless it is cached or being downloaded, returns if it started"""
+        if self.cache.contains(commit_hash):
+            return False
+
+        with self._lock:
+            if commit_hash in self._in_flight or len(self._in_flight) >= self.max_in_flight:
+                # the next snapshot tries again
+                return False
+            if time.monotonic() - self._failed.get(commit_hash, float("-inf")) < self.retry_interval:
+                return False
+            self._in_flight.add(commit_hash)
+
+        self._executor.submit(self._fetch, commit_hash)
+        return True
+
+    def _fetch(self, commit_hash):
+        try:
+            response = self.download(commit_hash)
+
+            if response['status'] == 0:
+                log = hash_utils.load_log_file(response['path'])
+                self.cache.put(commit_hash, json.dumps(log))
+                with self._lock:
+                    self._failed.pop(commit_hash, None)
+                LOGGER.info("Prefetched log %s", commit_hash)
+            else:
+                # the logger is still downloading it, polled again with the next snapshot
+                LOGGER.debug("Prefetching log %s, progress %s", commit_hash, response.get('progress'))
+        except Exception as e:
+            LOGGER.error("Failed to prefetch log %s", commit_hash)
+            LOGGER.exception(e)
+            with self._lock:
+                self._failed[commit_hash] = time.monotonic()
+        finally:
+            with self._lock:
+                self._in_flight.discard(commit_hash)
+
+# a single prefetcher for the whole process
+_PREFETCHER = None
+_PREFETCHER_LOCK = threading.Lock()
+
+def get_prefetcher(cache, download):
+    """Returns the process wide prefetcher filling the given cache"""
+    global _PREFETCHER
+
+    with _PREFETCHER_LOCK:
+        if _PREFETCHER is None:
+            _PREFETCHER = LogPrefetcher(cache, download)
+
+    return _PREFETCHER
@@ -0,0 +1,117 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import logging
+import threading
+
+from .. import constants as const
+
+LOGGER = logging
+
+# every group by name, for the stats
+_GROUPS = {}
+_GROUPS_LOCK = threading.Lock()
+
+class _Call:
+    """A call in flight, its result or error is set before the event"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one. The first caller of a key
+    runs the call and the ones arriving while it is in flight wait for it
+    and get the same result, or exception. Results are shared, so callers
+    must not modify them
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # key -> _Call
+        self._calls = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+        with _GROUPS_LOCK:
+            _GROUPS[name] = self
+
+    def do(self, key, function, *args, **kwargs):
+        """Returns the result of calling the given function, shared with the concurrent calls of the same key"""
+        if not const.SINGLE_FLIGHT_ENABLED:
+            return function(*args, **kwargs)
+
+        with self._lock:
+            # calls in flight in the parent when forking never finish in the child
+            if self._pid != os.getpid():
+                self._calls = {}
+                self._pid = os.getpid()
+
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            LOGGER.debug("Waiting for the %s call in flight for %s", self.name, key)
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+
+    def get_stats(self):
+        """Returns the counters of the group"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls)
+            }
+
+def get_stats():
+    """
+    Returns the counters of every group by name:
+    - calls: number of calls made
+    - executions: number of them that went upstream
+    - coalesced: number of them served by a call already in flight
+    - in_flight: number of calls currently in flight
+    """
+    with _GROUPS_LOCK:
+        groups = list(_GROUPS.values())
+
+    return {group.name: group.get_stats() for group in groups}
@@ -11,8 +11,11 @@ CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
 
+import os
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .. import constants as const
 from ..dispatcher import api
 from ..mapping import mapper
@@ -21,10 +24,31 @@ from ..db import db_utilities as db_utils
 
 LOGGER = logging
 
+# process wide pools of fetch workers by size, shared by every Fetcher so the
+# total number of in-flight dispatcher/blockchain calls stays bounded
+_EXECUTORS = {}
+_EXECUTORS_PID = None
+_EXECUTORS_LOCK = threading.Lock()
+
+def _get_executor(max_workers):
+    global _EXECUTORS_PID
+
+    with _EXECUTORS_LOCK:
+        # pools are created lazily, and again in forked gunicorn workers
+        if _EXECUTORS_PID != os.getpid():
+            _EXECUTORS.clear()
+            _EXECUTORS_PID = os.getpid()
+
+        if max_workers not in _EXECUTORS:
+            _EXECUTORS[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetcher")
+
+        return _EXECUTORS[max_workers]
+
 class Fetcher:
 
-    def __init__(self, address, url = const.DISPATCHER_URL):
+    def __init__(self, address, url = const.DISPATCHER_URL, max_in_flight = const.FETCHER_MAX_IN_FLIGHT):
         self.dispatcher_api = api.API(url)
+        self.max_in_flight = max_in_flight
         self.mapper = mapper.Mapper(address)
         self.blockchainDecorator = blockchain.BlockchainDecorator()
         LOGGER.debug("Instantiated fetcher with url %s", url)
@@ -39,46 +63,60 @@ class Fetcher:
 
         # getting all instances if any
         if indexes:
-            for index in indexes:
-                LOGGER.debug("Recovering tournament index %d", index)
+            # when batching, the blockchain information of all tournaments is read at once afterwards
+            decorate = not const.BLOCKCHAIN_BATCH_READS
+            fetch = lambda index: self._fetch_tournament(index, decorate)
 
-                # recovering dapp from the dispatcher
-                dapp = self.dispatcher_api.get_instance(index)
+            if self.max_in_flight > 1:
+                # fetch tournaments concurrently, map keeps the index order
+                recovered = _get_executor(self.max_in_flight).map(fetch, indexes)
+            else:
+                recovered = map(fetch, indexes)
 
-                # creating a tournament from the dapp
-                tournament = self.mapper.to_tournament(dapp)
+            recovered = [(dapp, tournament) for dapp, tournament in recovered if tournament]
 
-                if tournament:
-                    # complement with information from the blockchain
-                    self.blockchainDecorator.apply(dapp, tournament)
+            if not decorate:
+                # complement with information from the blockchain
+                self.blockchainDecorator.apply_all(recovered)
 
-                    LOGGER.debug("Adding to tournaments list")
-                    tournaments.append(tournament)
+            for _, tournament in recovered:
+                LOGGER.debug("Adding to tournaments list")
+                tournaments.append(tournament)
 
         LOGGER.info("Recovered tournaments")
         return tournaments
 
-    def get_tournament(self, tour_id):
+    def _fetch_tournament(self, index, decorate=True):
+        """Returns the dapp with the given index and the tournament mapped from it"""
+        LOGGER.debug("Recovering tournament index %d", index)
 
-        # get all instance indexes
-        indexes = self.dispatcher_api.get_instance_indexes()
+        # recovering dapp from the dispatcher
+        dapp = self.dispatcher_api.get_instance(index)
 
-        # checking if there are tournaments
-        if indexes:
-            int_tour_id = int(tour_id)
-            # checking if given id is among existing tournaments
-            if int_tour_id in indexes:
-                # recovering dapp from the dispatcher
-                dapp = self.dispatcher_api.get_instance(int_tour_id)
-                LOGGER.info("Returning tournament %s", tour_id)
+        # the instance may have vanished since the indexes were listed
+        if dapp is None:
+            return (None, None)
 
-                # creating a tournament from the dapp
-                tournament = self.mapper.to_tournament(dapp)
+        # creating a tournament from the dapp
+        tournament = self.mapper.to_tournament(dapp)
 
-                # complement with information from the blockchain
-                self.blockchainDecorator.apply(dapp, tournament)
+        if tournament and decorate:
+            # complement with information from the blockchain
+            self.blockchainDecorator.apply(dapp, tournament)
+
+        return (dapp, tournament)
+
+    def get_tournament(self, tour_id):
+
+        int_tour_id = int(tour_id)
+
+        # recovering dapp straight from the dispatcher, None if there is no such instance,
+        # so tournaments created after the latest listing are found too
+        dapp, tournament = self._fetch_tournament(int_tour_id)
 
-                return tournament
+        if dapp is not None:
+            LOGGER.info("Returning tournament %s", tour_id)
+            return tournament
 
         # not found
         LOGGER.info("Tournament %s not found", tour_id)
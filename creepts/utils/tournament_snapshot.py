@@ -0,0 +1,363 @@
+"""
+Copyright 2020 Cartesi Pte. Ltd.
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import copy
+import json
+import time
+import base64
+import logging
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from .. import constants as const
+from . import tournament_recovery_utils as tru
+
+LOGGER = logging
+
+SNAPSHOT_AGE_HEADER = "X-Snapshot-Age"
+SNAPSHOT_ERROR_HEADER = "X-Snapshot-Error"
+
+#Orderings kept by every snapshot, by the tournament attribute they sort on, besides the id one
+ORDERINGS = ("playerCount", "deadline")
+_ORDERED_ATTRIBUTES = ("id",) + ORDERINGS
+
+def _sort_key(tour, attribute):
+    value = getattr(tour, attribute)
+    # tournaments without a value go last, ties are broken by id
+    return (value is None, value if value is not None else 0, tour.id)
+
+def _precedes(key, other, descending):
+    """Returns if the sort key comes before the other one, in the given direction"""
+    if key[0] != other[0]:
+        # tournaments without a value go last either way
+        return other[0]
+    if descending and not key[0]:
+        return key > other
+    return key < other
+
+def _seek(keys, after, descending):
+    """Returns the position of the first of the sorted keys coming after the given one"""
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if _precedes(after, keys[middle], descending):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def encode_cursor(sort_by, descending, key):
+    """Returns the opaque cursor of the pages following the tournament with the given sort key"""
+    missing, value, tour_id = key
+    cursor = {
+        "sort_by": sort_by,
+        "order_by": "desc" if descending else "asc",
+        "key": [missing, value.isoformat() if isinstance(value, datetime) else value, tour_id]
+    }
+    return base64.urlsafe_b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Returns the sort_by, the descending flag and the sort key of the given cursor, raises ValueError if invalid"""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        sort_by = decoded["sort_by"]
+        descending = {"asc": False, "desc": True}[decoded["order_by"]]
+        missing, value, tour_id = decoded["key"]
+    except Exception:
+        raise ValueError("Invalid cursor: {}".format(cursor))
+
+    if (sort_by is not None and sort_by not in ORDERINGS) or not isinstance(missing, bool) or not _is_int(tour_id):
+        raise ValueError("Invalid cursor: {}".format(cursor))
+
+    # the value must compare with the sort keys of its ordering
+    if missing:
+        if value != 0:
+            raise ValueError("Invalid cursor: {}".format(cursor))
+    elif sort_by == "deadline":
+        if not isinstance(value, str):
+            raise ValueError("Invalid cursor: {}".format(cursor))
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is None:
+            raise ValueError("Invalid cursor: {}".format(cursor))
+    elif not _is_int(value):
+        raise ValueError("Invalid cursor: {}".format(cursor))
+
+    return sort_by, descending, (missing, value, tour_id)
+
+class TournamentSnapshot:
+    """
+    Immutable view of every tournament at a given moment. The tournaments in
+    it are shared by all readers and must not be modified, changes are made
+    by building a new snapshot. It keeps the tournaments sorted by id and by
+    each of the ORDERINGS, updated from the ones of the previous snapshot if given,
+    and indexed by phase and by the participation of the player
+    """
+
+    def __init__(self, tournaments, created_at, previous = None):
+        self.tournaments = tuple(tournaments)
+        self.by_id = MappingProxyType({tour.id: tour for tour in self.tournaments})
+        self.created_at = created_at
+        # attribute -> {tournament id: sort key}, and (attribute, descending) -> ids in that order
+        self._sort_keys = {}
+        self._orderings = {}
+
+        for attribute in _ORDERED_ATTRIBUTES:
+            self._sort_keys[attribute] = {tour.id: _sort_key(tour, attribute) for tour in self.tournaments}
+            ordering = self._build_ordering(attribute, previous)
+            self._orderings[(attribute, False)] = ordering
+
+            # the descending order reverses the tournaments with a value, the ones without it stay last
+            present = len(ordering) - sum(1 for key in self._sort_keys[attribute].values() if key[0])
+            self._orderings[(attribute, True)] = ordering[present - 1::-1] + ordering[present:] if present else ordering
+
+        # phase value -> ids, and ids of the tournaments the player takes part in
+        self._phase_ids = {}
+        for tour in self.tournaments:
+            self._phase_ids.setdefault(tour.phase.value if tour.phase else None, set()).add(tour.id)
+        self._participating = frozenset(tour.id for tour in self.tournaments if const.PLAYER_OWN_ADD in tour.scores)
+
+        # (phase, me, sort_by, descending) -> tournaments and their sort keys, filled as they are asked for,
+        # the ones asked for from the previous snapshot are built right away so no request pays for them
+        self._selections = {}
+        if previous is not None:
+            for key in list(previous._selections):
+                self._selections[key] = self._build_selection(*key)
+
+    def _build_ordering(self, attribute, previous):
+        keys = self._sort_keys[attribute]
+        if previous is None:
+            return tuple(sorted(keys, key=keys.get))
+
+        # start from the previous order, with the new tournaments at the end, timsort
+        # merges the few that moved in near linear time however many they are
+        ordering = [tour_id for tour_id in previous._orderings[(attribute, False)] if tour_id in keys]
+        if len(ordering) < len(keys):
+            kept = set(ordering)
+            ordering.extend(tour_id for tour_id in keys if tour_id not in kept)
+        ordering.sort(key=keys.get)
+
+        return tuple(ordering)
+
+    def ordered(self, sort_by = None, descending = False):
+        """
+        Returns an iterator over the tournaments sorted by the given attribute,
+        one of ORDERINGS, or by id if None. Tournaments without a value for it
+        come last in both directions
+        """
+        return (self.by_id[tour_id] for tour_id in self._ordering(sort_by, descending))
+
+    def _ordering(self, sort_by, descending):
+        return self._orderings[(sort_by or "id", descending)]
+
+    def select(self, phase = None, me = None, sort_by = None, descending = False):
+        """
+        Returns the tuple of tournaments in the given phase value, if any,
+        and which the player takes part in, if me is True, or not, if it is
+        False, sorted as by ordered. Each selection is built from the indexes
+        once per snapshot, when the snapshot is built if it was asked for
+        from the previous one, pages of it are slices
+        """
+        return self._select(phase, me, sort_by, descending)[0]
+
+    def _select(self, phase, me, sort_by, descending):
+        key = (phase, me, sort_by, descending)
+        selection = self._selections.get(key)
+
+        if selection is None:
+            selection = self._build_selection(*key)
+            # not locked on purpose: concurrent requests may build it twice, the builds
+            # are equal and setting a dict key is atomic, so either one can be kept
+            self._selections[key] = selection
+
+        return selection
+
+    def _build_selection(self, phase, me, sort_by, descending):
+        phase_ids = self._phase_ids.get(phase, ()) if phase is not None else None
+        ids = [tour_id for tour_id in self._ordering(sort_by, descending)
+               if (phase_ids is None or tour_id in phase_ids)
+               and (me is None or (tour_id in self._participating) == me)]
+        sort_keys = self._sort_keys[sort_by or "id"]
+
+        return tuple(self.by_id[tour_id] for tour_id in ids), tuple(sort_keys[tour_id] for tour_id in ids)
+
+    def page(self, phase = None, me = None, sort_by = None, descending = False, after = None, offset = 0, limit = None):
+        """
+        Returns a page of the given selection, the tournaments coming after the
+        sort key after, if given, skipping offset of them, and the sort key of
+        its last tournament if more follow it. Seeking by sort key keeps the
+        pages stable while tournaments come, go and change
+        """
+        tournaments, keys = self._select(phase, me, sort_by, descending)
+
+        start = offset
+        if after is not None:
+            start += _seek(keys, after, descending)
+        end = len(tournaments) if limit is None else start + limit
+
+        page = tournaments[start:end]
+        next_key = keys[end - 1] if page and end < len(tournaments) else None
+
+        return page, next_key
+
+    def get(self, tour_id):
+        """Returns the tournament with the given id or None if there is none"""
+        return self.by_id.get(int(tour_id))
+
+    def age(self):
+        """Returns how many seconds ago the snapshot was taken"""
+        return max(time.time() - self.created_at, 0.0)
+
+    def with_score(self, tour_id, player_id, score):
+        """
+        Returns a new snapshot in which the given score entry of the player is
+        merged into the scores of the tournament with the given id
+        """
+        tour = self.get(tour_id)
+        if tour is None:
+            return self
+
+        new_tour = copy.copy(tour)
+        new_tour.scores = {**tour.scores, player_id: score}
+
+        # the orderings don't depend on the scores, they are carried over as they are
+        return TournamentSnapshot([new_tour if t is tour else t for t in self.tournaments], self.created_at, self)
+
+class SnapshotPoller:
+    """
+    Keeps a snapshot of the tournaments, refreshed from the dispatcher,
+    the blockchain and the database by a background thread
+    """
+
+    def __init__(self, fetcher, interval = const.SNAPSHOT_REFRESH_INTERVAL):
+        self.fetcher = fetcher
+        self.interval = interval
+        self.last_error = None
+        self._snapshot = None
+        # score updates made while a refresh is running, None when there is none
+        self._updates = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Registers a callback called with every new snapshot, from the refresher thread"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def get_snapshot(self):
+        """
+        Returns the latest snapshot, the first call blocks until the first
+        refresh is done and raises the error in case it fails
+        """
+        self.start()
+
+        if self._snapshot is None:
+            with self._refresh_lock:
+                # another thread may have filled it while we waited
+                if self._snapshot is None:
+                    self._refresh()
+
+        return self._snapshot
+
+    def refresh(self):
+        """Rebuilds the snapshot from the upstream services"""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        with self._lock:
+            self._updates = []
+
+        try:
+            tournaments = self.fetcher.get_all_tournaments()
+            tournaments = self.fetcher.populate_scores_from_db(tournaments)
+            snapshot = TournamentSnapshot(tournaments, time.time(), self._snapshot)
+        except Exception as e:
+            with self._lock:
+                self._updates = None
+            self.last_error = str(e) or e.__class__.__name__
+            LOGGER.error("Failed to refresh tournaments snapshot")
+            raise
+
+        with self._lock:
+            # the scores stored while it was built may be missing from it, they are merged again
+            for tour_id, player_id, score in self._updates:
+                snapshot = snapshot.with_score(tour_id, player_id, score)
+            self._updates = None
+            self._snapshot = snapshot
+            listeners = list(self._listeners)
+        self.last_error = None
+        LOGGER.debug("Refreshed tournaments snapshot with %d tournaments", len(snapshot.tournaments))
+
+        for callback in listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                LOGGER.error("Snapshot listener failed")
+                LOGGER.exception(e)
+
+    def update_score(self, tour_id, player_id, score):
+        """Merges a newly stored score into the current snapshot, if any, and the one being refreshed"""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = self._snapshot.with_score(tour_id, player_id, score)
+            if self._updates is not None:
+                self._updates.append((tour_id, player_id, score))
+
+    def start(self):
+        """Starts the refresher thread, once per process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="snapshot-poller", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                LOGGER.exception(e)
+
+def set_staleness_headers(resp, poller, snapshot):
+    """Adds the age of the snapshot and the last refresh error, if any, to the response headers"""
+    resp.set_header(SNAPSHOT_AGE_HEADER, "{:.3f}".format(snapshot.age()))
+    if poller.last_error:
+        resp.set_header(SNAPSHOT_ERROR_HEADER, poller.last_error.replace("\n", " "))
+
+# keep a single poller per player address for the whole process
+POLLER_CACHE = {}
+_POLLER_CACHE_LOCK = threading.Lock()
+
+def get_poller(address):
+    """Returns the process wide snapshot poller for the given player address"""
+    with _POLLER_CACHE_LOCK:
+        if address not in POLLER_CACHE:
+            POLLER_CACHE[address] = SnapshotPoller(tru.Fetcher(address))
+
+        return POLLER_CACHE[address]